@@ -6,7 +6,8 @@ from src.data_loader import *
 from src.cleaning import *
 from src.features import *
 from src.config import INT_DATA,OUTCOME,TREATMENT,CONTROLS
-from src.doubleML import dr_learner
+from src.doubleML import DRLearner
+from src.inference import dr_inference
 from src.plots import *
 from src.causalTree import CausalTree
 from src.dataset import create_dataset
@@ -14,37 +15,34 @@ from src.dataset import create_dataset
 results_path='test1'
 dataset_path='final_dataset.csv'
 
-# Create dataset
+# Create dataset (stages whose code, config and inputs are unchanged are read from the cache)
+main = create_dataset()
 if dataset_path:
-    if Path(INT_DATA + dataset_path).is_file():
-        main = pd.read_csv(INT_DATA + dataset_path)
-    else:
-        main = create_dataset()
-        # Save cleaned data
-        main.to_csv(INT_DATA + dataset_path, index=False)
-else:
-    main = create_dataset()
+    # Save merged data
+    main.to_csv(INT_DATA + dataset_path, index=False)
 
 # Clean final dataset
 data, controls = clean_main(main, CONTROLS, TREATMENT, OUTCOME)
 print("Final dataset created")
 plot_final_summary(data, 'Plots/final_summary.png')
 
+# model matrices (the panel itself is stored in compact types)
+X = data[controls].to_numpy(dtype=float)
+y = data[OUTCOME].to_numpy(dtype=float)
+w = data[TREATMENT].to_numpy(dtype=int)
+
 # Run doubleml model
-results_dr = dr_learner(
-    X=data[controls].to_numpy(),
-    y=data[OUTCOME].to_numpy(),
-    w=data[TREATMENT].to_numpy()
-)
+dr = DRLearner()
+dr.fit(X=X, y=y, w=w)
+results_dr = dr.predict(X)
+
+# ATE inference from the DR scores, clustered by country
+print(dr_inference(dr.phi, clusters=data['ccode_cow']))
 
 # Run causal tree model
 ct = CausalTree(max_depth=20, min_sample_leaf=20)
-ct.fit(
-    X=data[controls].to_numpy(),
-    y=data[OUTCOME].to_numpy(),
-    w=data[TREATMENT].to_numpy()
-)
-results_ct = ct.predict(data[controls].to_numpy())
+ct.fit(X=X, y=y, w=w)
+results_ct = ct.predict(X)
 
 # rejoin the results to clean data
 data_results = data.copy()
@@ -0,0 +1,202 @@
+## on-disk caches
+import functools
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pyarrow import ArrowException
+from src.config import LOADER_CACHE
+
+
+# content hash of numpy arrays (dtype, shape and data) and of any extra values
+def hash_content(*arrays, extra=None) -> str:
+    h = hashlib.sha256()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype.str, a.shape)).encode())
+        h.update(a.data if a.dtype != object else repr(a.tolist()).encode())
+    if extra is not None:
+        h.update(repr(extra).encode())
+    return h.hexdigest()
+
+
+# stable description of an estimator's configuration (thread counts do not change results)
+def describe_model(model) -> str:
+    if model is None:
+        return 'None'
+    params = {k: v for k, v in model.get_params().items() if not k.endswith('n_jobs')}
+    return f"{type(model).__name__}({sorted(params.items())!r})"
+
+
+class DiskCache:
+    """
+    Directory of cache entries named by key. Entries are touched when read and
+    the least recently used ones are deleted once the directory grows beyond
+    max_bytes (None keeps everything).
+    """
+    def __init__(self, directory, max_bytes=None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key:str, suffix:str) -> Path:
+        return self.directory / (key + suffix)
+
+    # new empty temporary file for one writer of an entry (several processes may write the same key)
+    def tmp_path(self, key:str, suffix:str) -> Path:
+        fd, name = tempfile.mkstemp(prefix=key + '.', suffix='.tmp' + suffix, dir=self.directory)
+        os.close(fd)
+        return Path(name)
+
+    def load_arrays(self, key:str):
+        path = self.path(key, '.npz')
+        try:
+            os.utime(path)
+            with np.load(path) as data:
+                return {k: data[k] for k in data.files}
+        except FileNotFoundError:  # missing, or evicted by another process
+            return None
+
+    def save_arrays(self, key:str, **arrays) -> None:
+        path = self.path(key, '.npz')
+        # write to a temporary file first so readers never see a partial entry
+        tmp = self.tmp_path(key, '.npz')
+        try:
+            np.savez(tmp, **arrays)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.evict()
+
+    def evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        entries = []
+        for p in self.directory.iterdir():
+            # files being written by other processes are not entries yet
+            if '.tmp' in p.suffixes:
+                continue
+            try:
+                stat = p.stat()
+            except FileNotFoundError:  # replaced or evicted by another process
+                continue
+            if not p.is_file():
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        # delete least recently used entries first
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+
+
+# write bytes or text to path through a new temporary file in the same
+# directory, so that readers and concurrent writers never see a partial file
+def write_atomic(path, data) -> None:
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+        os.replace(tmp, path)
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+
+
+# JSON content of a file, {} if it is missing or cut short
+def read_json(path) -> dict:
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+# sha256 of a file's content, read in blocks
+def hash_file(path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# make object columns storable as Parquet: columns mixing types (e.g. numbers
+# and strings read from Excel) are stored as pickled values, so that a cached
+# read gives back the same values and types; returns the frame and those columns
+def _parquet_safe(df) -> tuple[pd.DataFrame, list]:
+    df = df.copy()
+    pickled = []
+    for c in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[c], skipna=True) in ('mixed', 'mixed-integer', 'mixed-integer-float'):
+            df[c] = [pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL) for v in df[c]]
+            pickled.append(c)
+    return df, pickled
+
+
+# read a cached loader output back, unpickling the columns _parquet_safe pickled
+def _read_cached(data_path, manifest) -> pd.DataFrame:
+    df = pd.read_parquet(data_path)
+    for c in manifest['pickled']:
+        df[c] = pd.Series([pickle.loads(v) for v in df[c]], index=df.index, dtype=object)
+    return df
+
+
+def cached_loader(func):
+    """
+    Cache the DataFrame returned by a loader `func(path, ...)` as a Parquet file.
+
+    Entries are keyed by the loader, the source path and the other arguments,
+    and record the source's size, mtime and content hash. A changed size or
+    mtime triggers a content hash check, and a changed hash reloads the source.
+    The wrapped loader takes an extra `cache_dir` argument (LOADER_CACHE by
+    default, None disables the cache).
+    """
+    @functools.wraps(func)
+    def wrapper(path, *args, cache_dir=LOADER_CACHE, **kwargs):
+        if cache_dir is None:
+            return func(path, *args, **kwargs)
+
+        cache = DiskCache(cache_dir)
+        key = func.__name__ + '_' + hash_content(extra=(str(Path(path).resolve()), args, sorted(kwargs.items())))[:24]
+        data_path = cache.path(key, '.parquet')
+        manifest_path = cache.path(key, '.json')
+
+        stat = os.stat(path)
+        manifest = read_json(manifest_path)
+        # entries written before mixed columns were pickled are rebuilt
+        if data_path.exists() and 'pickled' in manifest:
+            if (manifest['size'], manifest['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                return _read_cached(data_path, manifest)
+            # touched but possibly unchanged file: compare content
+            content_hash = hash_file(path)
+            if content_hash == manifest['sha256']:
+                manifest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                write_atomic(manifest_path, json.dumps(manifest))
+                return _read_cached(data_path, manifest)
+        else:
+            content_hash = hash_file(path)
+
+        df = func(path, *args, **kwargs)
+
+        tmp = cache.tmp_path(key, '.parquet')
+        pickled = []
+        try:
+            try:
+                df.to_parquet(tmp)
+            except (TypeError, ValueError, ArrowException):
+                safe, pickled = _parquet_safe(df)
+                safe.to_parquet(tmp)
+            os.replace(tmp, data_path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        write_atomic(manifest_path, json.dumps({'source': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                                'sha256': content_hash, 'pickled': pickled}))
+        return df
+
+    return wrapper
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.causalTree import CausalTree
+
+
+# fit a batch of trees, each on its own subsample and with its own random generator
+# (module level so that it can be sent to worker processes)
+def _fit_trees(X, y, w, seeds, sample_size, tree_params):
+    trees = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(y), size=sample_size, replace=False)
+        tree = CausalTree(random_state=rng, **tree_params)
+        tree.fit(X[rows], y[rows], w[rows])
+        trees.append(tree)
+    return trees
+
+
+class CausalForest:
+    """
+    Average of honest CausalTrees, each fitted on a random subsample drawn
+    without replacement. Every tree gets its own np.random.Generator spawned
+    from `random_state`, so a fit is reproducible for a given seed whatever
+    the number of workers.
+    """
+    def __init__(self, n_estimators=200, max_depth=3, min_sample_leaf=10, val_split=0.5,
+                 sample_fraction=0.5, max_bins=None, n_jobs=None, random_state=None):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.min_sample_leaf = min_sample_leaf
+        self.val_split = val_split
+        self.sample_fraction = sample_fraction
+        self.max_bins = max_bins
+        # None or 1 fits in the current process, -1 uses all cores
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.trees = []
+
+    def fit(self, X, y, w):
+        X = np.asarray(X)
+        y = np.asarray(y)
+        w = np.asarray(w)
+
+        # one independent seed per tree
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_estimators)
+        sample_size = int(self.sample_fraction * len(y))
+        tree_params = {'max_depth': self.max_depth,
+                       'min_sample_leaf': self.min_sample_leaf,
+                       'val_split': self.val_split,
+                       'max_bins': self.max_bins}
+
+        n_workers = os.cpu_count() if self.n_jobs == -1 else (self.n_jobs or 1)
+        n_workers = max(1, min(n_workers, self.n_estimators))
+
+        if n_workers == 1:
+            self.trees = _fit_trees(X, y, w, seeds, sample_size, tree_params)
+            return self
+
+        # send contiguous batches of seeds to the workers so the data is shipped
+        # once per worker; results come back in seed order
+        batches = np.array_split(np.arange(self.n_estimators), n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(_fit_trees, X, y, w, [seeds[i] for i in batch], sample_size, tree_params)
+                       for batch in batches]
+            self.trees = [tree for f in futures for tree in f.result()]
+
+        return self
+
+    def predict(self, X, return_var=False):
+        """
+        Average the honest leaf estimates of all trees for each row of X.
+        Trees whose leaf has no estimate (NaN tau) are skipped for that row.
+        If return_var, also return the per-row variance of the tree estimates
+        around that average.
+        """
+        X = np.asarray(X)
+        # accumulate running sums instead of stacking (n_estimators, n) predictions
+        total = np.zeros(X.shape[0])
+        total_sq = np.zeros(X.shape[0])
+        count = np.zeros(X.shape[0])
+        for tree in self.trees:
+            tau = tree.predict(X)
+            ok = ~np.isnan(tau)
+            tau = np.where(ok, tau, 0)
+            total += tau
+            total_sq += tau**2
+            count += ok
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tau_hat = total / count
+            if not return_var:
+                return tau_hat
+            var = np.maximum(total_sq - count * tau_hat**2, 0) / (count - 1)
+
+        return tau_hat, var
@@ -1,89 +1,208 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 # Note: Graphviz support removed — plotting uses Matplotlib in `src.plots.plot_causal_tree`.
 
-class Node:
-    def __init__(self, depth, tau=None, feature=None, threshold=None, left=None, right=None, n_samples=0):
-        self.tau = tau
-        self.feature = feature
-        self.threshold = threshold
-        self.left = left
-        self.right = right
-        self.n_samples = n_samples
-        self.depth = depth
-        self.is_leaf = False
-        
+class FlatTree:
+    """
+    Compact representation of a fitted tree as parallel NumPy arrays indexed by
+    node id. Nodes are stored in pre-order (node, left subtree, right subtree),
+    so node 0 is the root and every child has a larger id than its parent.
+    Leaves have `left == right == -1`, `feature == -1` and a NaN threshold.
+    """
+    def __init__(self, feature, threshold, left, right, tau, n_samples, depth):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=float)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.tau = np.asarray(tau, dtype=float)
+        self.n_samples = np.asarray(n_samples, dtype=np.intp)
+        self.depth = np.asarray(depth, dtype=np.intp)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def is_leaf(self):
+        return self.left == -1
+
+    def compact(self):
+        """
+        Return a copy holding only the nodes reachable from the root, renumbered
+        in pre-order. Used after pruning, which turns internal nodes into leaves
+        and leaves their former descendants orphaned.
+        """
+        order = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if self.left[node] != -1:
+                stack.append(self.right[node])
+                stack.append(self.left[node])
+        order = np.asarray(order, dtype=np.intp)
+
+        new_id = np.full(self.node_count, -1, dtype=np.intp)
+        new_id[order] = np.arange(len(order))
+        left = np.where(self.left[order] == -1, -1, new_id[self.left[order]])
+        right = np.where(self.right[order] == -1, -1, new_id[self.right[order]])
+
+        return FlatTree(self.feature[order], self.threshold[order], left, right,
+                        self.tau[order], self.n_samples[order], self.depth[order])
+
+    def apply(self, X):
+        """
+        Return the id of the leaf reached by each row of X. All rows are routed
+        together one level at a time with vectorized comparisons.
+        """
+        X = np.asarray(X)
+        node = np.zeros(X.shape[0], dtype=np.intp)
+        active = np.flatnonzero(self.left[node] != -1)
+        while active.size:
+            current = node[active]
+            go_left = X[active, self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.left[node[active]] != -1]
+        return node
+
 
 class CausalTree:
-    def __init__(self, max_depth=3, min_sample_leaf=10, val_split=0.5):
+    # minimum node size for the feature scan to use the thread pool
+    parallel_min_samples = 2000
+
+    def __init__(self, max_depth=3, min_sample_leaf=10, val_split=0.5, random_state=None, max_bins=None, n_jobs=None):
         self.max_depth = max_depth
         self.min_sample_leaf = min_sample_leaf
         self.val_split = val_split
-        self.root = None
+        # None uses the global np.random state, otherwise a seed or np.random.Generator
+        self.random_state = random_state
+        # None searches every unique threshold (exact), otherwise the number of
+        # quantile bins per feature used by the approximate histogram search (<= 256)
+        self.max_bins = max_bins
+        # None or 1 scans features serially, -1 uses all cores (exact mode only)
+        self.n_jobs = n_jobs
+        self.bin_edges = None
+        self.tree = None
+        self._executor = None
 
     def fit(self, X, y, w):
+        X = np.asarray(X)
+        y = np.asarray(y)
+        w = np.asarray(w)
+
+        # All samples are addressed through one shared index array. Every stage
+        # below works on a contiguous segment of it and partitions that segment
+        # in place, so X, y and w are never copied per node.
+
+        rng = np.random if self.random_state is None else np.random.default_rng(self.random_state)
+
         # data splitting between training and estimation samples
         N = len(y)
-        idx = np.random.permutation(N)
+        idx = rng.permutation(N)
         idx_tr, idx_est = idx[:N//2], idx[N//2:]
 
-        x_tr, y_tr, w_tr = X[idx_tr], y[idx_tr], w[idx_tr]
-        x_est, y_est, w_est = X[idx_est], y[idx_est], w[idx_est]
-
         # data splitting between training and validation samples
-        N_tr = len(y_tr)
-        idx_val = np.random.permutation(N_tr)
-        idx_tr_tr, idx_tr_val = idx_val[:N_tr//2], idx_val[N_tr//2:]
-        x_tr_tr, y_tr_tr, w_tr_tr = x_tr[idx_tr_tr], y_tr[idx_tr_tr], w_tr[idx_tr_tr]
-        x_tr_val, y_tr_val, w_tr_val = x_tr[idx_tr_val], y_tr[idx_tr_val], w_tr[idx_tr_val]
+        N_tr = len(idx_tr)
+        idx_val = rng.permutation(N_tr)
+        idx_tr[:] = idx_tr[idx_val]
+        idx_tr_tr, idx_tr_val = idx_tr[:N_tr//2], idx_tr[N_tr//2:]
 
         # compute global propensity for training (used in honest criterion)
-        p_tr = np.mean(w_tr_tr)
-        p_val = np.mean(w_tr_val)
+        p_tr = np.mean(w[idx_tr_tr])
+        p_val = np.mean(w[idx_tr_val])
+
+        # quantile-bin every feature once for the approximate split search
+        X_binned = None
+        if self.max_bins is not None:
+            self.bin_edges = self.fit_bins(X, self.max_bins)
+            X_binned = self.transform_bins(X, self.bin_edges)
 
         # Build tree using training data
-        self.root = self.build_tree(x_tr_tr, y_tr_tr, w_tr_tr, len(y_tr_tr), p_tr, depth=0, max_depth=self.max_depth, min_leaf=self.min_sample_leaf)
+        n_threads = os.cpu_count() if self.n_jobs == -1 else (self.n_jobs or 1)
+        if n_threads > 1 and X_binned is None:
+            self._executor = ThreadPoolExecutor(max_workers=n_threads)
+        try:
+            tree = self.build_tree(X, y, w, idx_tr_tr, len(idx_tr_tr), p_tr, max_depth=self.max_depth, min_leaf=self.min_sample_leaf, X_binned=X_binned)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
 
         # Prune tree using validation data
-        self.root = self.prune(self.root, x_tr_val, y_tr_val, w_tr_val, len(y_tr_val), p_val)
+        tree = self.prune(tree, X, y, w, idx_tr_val, len(idx_tr_val), p_val)
 
         # Honest estimation of treatment effects in leaves using estimation data
-        self.estimate_honest_values(self.root, x_est, y_est, w_est)
+        self.estimate_honest_values(tree, X, y, w, idx_est)
+
+        self.tree = tree
+        return self
 
     def predict(self, X):
-        return np.array([self.traverse_tree(x, self.root) for x in X])
-    
-    def traverse_tree(self, x, node):
-        if node.is_leaf:
-            return node.tau
-        if x[node.feature] <= node.threshold:
-            return self.traverse_tree(x, node.left)
-        return self.traverse_tree(x, node.right)
+        return self.tree.tau[self.apply(X)]
+
+    def apply(self, X):
+        """
+        Return the id of the leaf each row of X falls into (ids index the
+        arrays of `self.tree` and the rows of `to_dataframe()`).
+        """
+        return self.tree.apply(X)
     
-    def prune(self, node, x_val, y_val, w_val, n_val, p):
-        # recursive pruning that looks at leafs first and goes up the tree
-        if node.is_leaf:
-            return node
-        
-        # send to children
-        idx_left = x_val[:, node.feature] <= node.threshold
-        node.left = self.prune(node.left, x_val[idx_left], y_val[idx_left], w_val[idx_left], n_val, p)
-        node.right = self.prune(node.right, x_val[~idx_left], y_val[~idx_left], w_val[~idx_left], n_val, p)
-
-        # If both children are leaves, check if split helps on validation data
-        if node.left.is_leaf and node.right.is_leaf:
-            score_left = self.calculate_honest_criterion(y_val[idx_left], w_val[idx_left], n_val, p)
-            score_right = self.calculate_honest_criterion(y_val[~idx_left], w_val[~idx_left], n_val, p)
+    def partition(self, X, idx, start, end, feature, threshold):
+        """
+        Reorder idx[start:end] in place so that rows going left come first
+        (keeping their relative order) and return the boundary position.
+        """
+        segment = idx[start:end]
+        go_left = X[segment, feature] <= threshold
+        idx[start:end] = np.concatenate((segment[go_left], segment[~go_left]))
+        return start + int(np.count_nonzero(go_left))
+
+    def route(self, tree, X, idx):
+        """
+        Send the rows in idx down the tree, partitioning idx in place.
+        Returns (start, end) arrays such that idx[start[k]:end[k]] are the
+        rows reaching node k.
+        """
+        start = np.zeros(tree.node_count, dtype=np.intp)
+        end = np.zeros(tree.node_count, dtype=np.intp)
+        stack = [(0, 0, len(idx))]
+        while stack:
+            node, lo, hi = stack.pop()
+            start[node], end[node] = lo, hi
+            if tree.left[node] == -1:
+                continue
+            mid = self.partition(X, idx, lo, hi, tree.feature[node], tree.threshold[node])
+            stack.append((tree.right[node], mid, hi))
+            stack.append((tree.left[node], lo, mid))
+        return start, end
+
+    def prune(self, tree, X, y, w, idx_val, n_val, p):
+        # pruning that looks at leafs first and goes up the tree: nodes are stored
+        # in pre-order, so visiting ids backwards sees every child before its parent
+        start, end = self.route(tree, X, idx_val)
+
+        for node in range(tree.node_count - 1, -1, -1):
+            left, right = tree.left[node], tree.right[node]
+            # If both children are leaves, check if split helps on validation data
+            if left == -1 or tree.left[left] != -1 or tree.left[right] != -1:
+                continue
+
+            rows_left = idx_val[start[left]:end[left]]
+            rows_right = idx_val[start[right]:end[right]]
+            rows = idx_val[start[node]:end[node]]
+            score_left = self.calculate_honest_criterion(y[rows_left], w[rows_left], n_val, p)
+            score_right = self.calculate_honest_criterion(y[rows_right], w[rows_right], n_val, p)
             score_split = score_left + score_right
-            score_nosplit = self.calculate_honest_criterion(y_val, w_val, n_val, p)
+            score_nosplit = self.calculate_honest_criterion(y[rows], w[rows], n_val, p)
 
             if score_nosplit >= score_split:
-                node.is_leaf = True
-                node.left = node.right = None
-                
-        return node
-        
-        
+                tree.left[node] = tree.right[node] = tree.feature[node] = -1
+                tree.threshold[node] = np.nan
+
+        return tree.compact()
+
     def calculate_honest_criterion(self, y, w, n_tr, p):
         # separate control and treated data
         y0 = y[w==0]
@@ -109,77 +228,252 @@ class CausalTree:
 
         return term1 - term2
     
-    def find_best_split(self, X, y, w, n_tr, p, min_leaf):
+    def honest_criterion_from_sums(self, n1, s1, q1, n0, s0, q0, n_tr, p):
+        """
+        Vectorized version of `calculate_honest_criterion` working on the count,
+        sum and sum of squares of y in each treatment arm. All arguments can be
+        arrays (one entry per candidate split).
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # calculate treatment effect by difference of means
+            tau_hat = s1/n1 - s0/n0
+
+            # calculate variance (ddof=1), guarding against tiny negative rounding errors
+            var1 = np.maximum(q1 - s1**2/n1, 0)/(n1 - 1)
+            var0 = np.maximum(q0 - s0**2/n0, 0)/(n0 - 1)
+
+            # term 1
+            term1 = (1/n_tr) * (n1*tau_hat**2)
+
+            # term 2
+            term2 = (2/n_tr)*(var1/p + var0/(1-p))
+
+            score = term1 - term2
+
+        return np.where((n1 < 2) | (n0 < 2), -np.inf, score)
+
+    def score_feature(self, x_j, y, w, n_tr, p, min_leaf):
+        """
+        Best split of one feature column x_j of a node (y centered). Returns
+        (score, threshold), with score -inf when no split is valid.
+        """
+        n = len(x_j)
+
+        # sort the node once along feature j
+        order = np.argsort(x_j, kind='stable')
+        x_sorted = x_j[order]
+        y_sorted = y[order]
+        w_sorted = w[order]
+
+        # a threshold is only valid between two distinct values and must
+        # leave at least min_leaf observations on each side
+        n_left = np.arange(1, n)
+        valid = ((x_sorted[:-1] < x_sorted[1:])
+                 & (n_left >= min_leaf)
+                 & (n - n_left >= min_leaf))
+        if not valid.any():
+            return -np.inf, None
+
+        # per-arm count, sum and sum of squares of y in the left child (the
+        # first i+1 sorted rows) and in the right child (the remaining rows)
+        left_sums, right_sums = [], []
+        for arm in (1, 0):
+            in_arm = (w_sorted == arm).astype(float)
+            y_arm = y_sorted * in_arm
+            for v in (in_arm, y_arm, y_arm * y_sorted):
+                left_sums.append(np.cumsum(v)[:-1])
+                right_sums.append(np.cumsum(v[::-1])[::-1][1:])
+
+        score_left = self.honest_criterion_from_sums(*left_sums, n_tr, p)
+        score_right = self.honest_criterion_from_sums(*right_sums, n_tr, p)
+
+        score = np.where(valid, score_left + score_right, -np.inf)
+        score[np.isnan(score)] = -np.inf
+
+        # first maximum, i.e. the smallest threshold among ties
+        i = int(np.argmax(score))
+        return score[i], x_sorted[i]
+
+    def find_best_split(self, X, y, w, idx, n_tr, p, min_leaf):
+        # search the best split of the rows idx of (X, y, w)
         best_score = -np.inf
         best_feature = None
+        n = len(idx)
         n_features = X.shape[1]
 
-        for j in range(n_features):
-            thresholds = np.unique(X[:, j])
-            for threshold in thresholds:
-                left_mask = X[:, j] <= threshold
-                right_mask = X[:, j] > threshold
+        if n < 2:
+            return best_feature
 
-                if np.sum(left_mask) < min_leaf or np.sum(right_mask) < min_leaf:
-                    continue
+        # center y so that the running sums of squares stay well conditioned
+        # (differences of means and variances are unchanged)
+        y = y[idx]
+        y = y - np.mean(y)
+        w = w[idx]
 
-                score_left = self.calculate_honest_criterion(y[left_mask], w[left_mask], n_tr, p)
-                score_right = self.calculate_honest_criterion(y[right_mask], w[right_mask], n_tr, p)
-                
-                if score_left == -np.inf or score_right == -np.inf:
-                    continue
-                
-                score = score_left + score_right
+        # only one column is gathered at a time
+        def _score(j):
+            return self.score_feature(X[idx, j], y, w, n_tr, p, min_leaf)
 
-                if score > best_score:
-                    best_score = score
-                    best_feature = (j, threshold)
+        # large nodes spread the features over the thread pool (sorting and
+        # cumulative sums release the GIL), small ones are scanned serially
+        if self._executor is not None and n >= self.parallel_min_samples:
+            results = self._executor.map(_score, range(n_features))
+        else:
+            results = map(_score, range(n_features))
+
+        # reduce in feature order so ties resolve exactly as in the serial scan
+        for j, (score, threshold) in enumerate(results):
+            if score > best_score:
+                best_score = score
+                best_feature = (j, threshold)
 
         return best_feature
     
-    def build_tree(self, x_tr, y_tr, w_tr, n_tr, p, depth, max_depth, min_leaf):
-        node = Node(depth)
-        node.n_samples = x_tr.shape[0]
+    def fit_bins(self, X, max_bins):
+        """
+        Compute the bin edges of each feature: its unique values when there are
+        at most max_bins of them, otherwise max_bins quantiles. Edges are data
+        values, so a split `x <= edge` can be applied to the raw features.
+        """
+        if not 2 <= max_bins <= 256:
+            raise ValueError("max_bins must be between 2 and 256")
+
+        bin_edges = []
+        for j in range(X.shape[1]):
+            values = X[:, j][~np.isnan(X[:, j])]
+            uniq = np.unique(values)
+            if len(uniq) <= max_bins:
+                edges = uniq[:-1]
+            else:
+                quantiles = np.linspace(0, 1, max_bins + 1)[1:-1]
+                edges = np.unique(np.quantile(values, quantiles, method='inverted_cdf'))
+            bin_edges.append(edges)
+        return bin_edges
+
+    def transform_bins(self, X, bin_edges):
+        # bin code b means edges[b-1] < x <= edges[b], so x <= edges[b] iff code <= b
+        X_binned = np.empty(X.shape, dtype=np.uint8)
+        for j, edges in enumerate(bin_edges):
+            X_binned[:, j] = np.searchsorted(edges, X[:, j], side='left')
+        return X_binned
+
+    def histogram(self, X_binned, y, w, idx):
+        """
+        Per-feature histograms of the rows idx, shape (7, n_features, max_bins):
+        count of all rows, then count, sum and sum of squares of y for the
+        treated and for the controls.
+        """
+        n_features = X_binned.shape[1]
+        hist = np.empty((7, n_features, self.max_bins))
+        # one arm and one feature at a time on the uint8 codes, so no
+        # n x n_features temporary is built
+        for k, arm in ((1, 1), (4, 0)):
+            rows = idx[w[idx] == arm]
+            y_arm = y[rows]
+            y_sq = y_arm**2
+            for j in range(n_features):
+                codes = X_binned[rows, j]
+                hist[k, j] = np.bincount(codes, minlength=self.max_bins)
+                hist[k + 1, j] = np.bincount(codes, weights=y_arm, minlength=self.max_bins)
+                hist[k + 2, j] = np.bincount(codes, weights=y_sq, minlength=self.max_bins)
+        hist[0] = hist[1] + hist[4]
+        return hist
+
+    def find_best_split_binned(self, hist, n_tr, p, min_leaf):
+        # same search as find_best_split, with candidate thresholds restricted to bin edges
+        left = np.cumsum(hist, axis=2)[:, :, :-1]
+        right = hist.sum(axis=2, keepdims=True) - left
+
+        score_left = self.honest_criterion_from_sums(*left[1:], n_tr, p)
+        score_right = self.honest_criterion_from_sums(*right[1:], n_tr, p)
+
+        # a bin can only be split on if it has an edge and leaves min_leaf rows on each side
+        n_edges = np.array([len(edges) for edges in self.bin_edges])
+        valid = ((np.arange(self.max_bins - 1) < n_edges[:, None])
+                 & (left[0] >= min_leaf)
+                 & (right[0] >= min_leaf))
+
+        score = np.where(valid, score_left + score_right, -np.inf)
+        score[np.isnan(score)] = -np.inf
+
+        # first maximum in (feature, threshold) order, as in the exact search
+        j, b = np.unravel_index(np.argmax(score), score.shape)
+        if score[j, b] == -np.inf:
+            return None
+        return (int(j), self.bin_edges[j][b])
+
+    def build_tree(self, X, y, w, idx, n_tr, p, max_depth, min_leaf, X_binned=None):
+        # grow the tree depth-first with an explicit work stack; each work item is
+        # a contiguous segment idx[start:end] that is partitioned in place when split
+        # (and, in binned mode, the histograms of that segment when already known)
+        if X_binned is not None:
+            # center y once so that histograms can be subtracted between nodes
+            y = y - np.mean(y[idx])
+
+        feature, threshold, left, right, n_samples, depth = [], [], [], [], [], []
+        stack = [(0, len(idx), 0, -1, False, None)]
+        while stack:
+            start, end, node_depth, parent, is_right, hist = stack.pop()
+            node = len(feature)
+            if parent >= 0:
+                (right if is_right else left)[parent] = node
+
+            feature.append(-1)
+            threshold.append(np.nan)
+            left.append(-1)
+            right.append(-1)
+            n_samples.append(end - start)
+            depth.append(node_depth)
+
+            if node_depth >= max_depth:
+                continue
+
+            if X_binned is None:
+                split = self.find_best_split(X, y, w, idx[start:end], n_tr, p, min_leaf)
+            else:
+                if hist is None:
+                    hist = self.histogram(X_binned, y, w, idx[start:end])
+                split = self.find_best_split_binned(hist, n_tr, p, min_leaf)
 
-        if depth >= max_depth:
-            node.is_leaf = True
-            return node
-        
-        split = self.find_best_split(x_tr, y_tr, w_tr, n_tr, p, min_leaf)
+            if split is None:
+                continue
 
-        if split == None:
-            node.is_leaf = True
-            return node
+            feature[node], threshold[node] = split
 
-        node.feature, node.threshold = split
+            # move rows going left to the front of the segment, then create children
+            # (right is pushed first so that the left subtree is numbered first)
+            mid = self.partition(X, idx, start, end, feature[node], threshold[node])
 
-        # get indices from threshold
-        idx_left = x_tr[:, node.feature] <= node.threshold
-        # create left and right children
-        node.left = self.build_tree(x_tr[idx_left], y_tr[idx_left], w_tr[idx_left], n_tr, p, depth+1, max_depth, min_leaf)
-        node.right = self.build_tree(x_tr[~idx_left], y_tr[~idx_left], w_tr[~idx_left], n_tr, p, depth+1, max_depth, min_leaf)
+            # only the smaller child's histogram is built from its rows, the
+            # sibling's is the parent's minus it
+            hist_left = hist_right = None
+            if X_binned is not None and node_depth + 1 < max_depth:
+                if mid - start <= end - mid:
+                    hist_left = self.histogram(X_binned, y, w, idx[start:mid])
+                    hist_right = hist - hist_left
+                else:
+                    hist_right = self.histogram(X_binned, y, w, idx[mid:end])
+                    hist_left = hist - hist_right
 
-        return node
-    
-    def estimate_honest_values(self, node, x_est, y_est, w_est):
-        if node is None:
-            return
+            stack.append((mid, end, node_depth+1, node, True, hist_right))
+            stack.append((start, mid, node_depth+1, node, False, hist_left))
+
+        tau = np.full(len(feature), np.nan)
+        return FlatTree(feature, threshold, left, right, tau, n_samples, depth)
+
+    def estimate_honest_values(self, tree, X, y, w, idx_est):
+        start, end = self.route(tree, X, idx_est)
 
-        if node.is_leaf:
+        for node in np.flatnonzero(tree.is_leaf):
             # calculate CATE using estimation sample
-            y1 = y_est[w_est==1]
-            y0 = y_est[w_est==0]
+            rows = idx_est[start[node]:end[node]]
+            y1 = y[rows][w[rows]==1]
+            y0 = y[rows][w[rows]==0]
 
             if len(y1) > 0 and len(y0) > 0:
-                node.tau = np.mean(y1) - np.mean(y0)
+                tree.tau[node] = np.mean(y1) - np.mean(y0)
             else:
-                node.tau = np.nan
-            return
-
-        # if not leaf, pass down to children
-        idx_left = x_est[:, node.feature] <= node.threshold
-        self.estimate_honest_values(node.left, x_est[idx_left], y_est[idx_left], w_est[idx_left])
-        self.estimate_honest_values(node.right, x_est[~idx_left], y_est[~idx_left], w_est[~idx_left])
+                tree.tau[node] = np.nan
 
     def collect_nodes(self):
         """
@@ -187,21 +481,19 @@ class CausalTree:
         feature, threshold, tau, n_samples, depth, is_leaf
         """
         nodes = []
-        def _rec(node):
-            if node is None:
-                return
+        if self.tree is None:
+            return nodes
+        t = self.tree
+        for i in range(t.node_count):
+            is_leaf = bool(t.left[i] == -1)
             nodes.append({
-                'feature': node.feature,
-                'threshold': node.threshold,
-                'tau': getattr(node, 'tau', None),
-                'n_samples': node.n_samples,
-                'depth': node.depth,
-                'is_leaf': node.is_leaf
+                'feature': None if is_leaf else int(t.feature[i]),
+                'threshold': None if is_leaf else t.threshold[i],
+                'tau': t.tau[i] if is_leaf else None,
+                'n_samples': int(t.n_samples[i]),
+                'depth': int(t.depth[i]),
+                'is_leaf': is_leaf
             })
-            if not node.is_leaf:
-                _rec(node.left)
-                _rec(node.right)
-        _rec(self.root)
         return nodes
 
     def print_tree(self, feature_names=None):
@@ -209,21 +501,18 @@ class CausalTree:
         Pretty-print the tree structure. If feature_names is provided (list),
         it will use them; otherwise, it will use `X[i]`.
         """
-        if self.root is None:
+        if self.tree is None:
             print("Empty tree")
             return
 
-        def _rec(node):
-            indent = "  " * node.depth
-            if node.is_leaf:
-                print(f"{indent}Leaf depth={node.depth} n={node.n_samples} tau={node.tau}")
-                return
-            fname = feature_names[node.feature] if (feature_names is not None and node.feature is not None) else f"X[{node.feature}]"
-            print(f"{indent}Node depth={node.depth} {fname} <= {node.threshold} n={node.n_samples}")
-            _rec(node.left)
-            _rec(node.right)
-
-        _rec(self.root)
+        # nodes are stored in pre-order, which is the printing order
+        for n in self.collect_nodes():
+            indent = "  " * n['depth']
+            if n['is_leaf']:
+                print(f"{indent}Leaf depth={n['depth']} n={n['n_samples']} tau={n['tau']}")
+                continue
+            fname = feature_names[n['feature']] if feature_names is not None else f"X[{n['feature']}]"
+            print(f"{indent}Node depth={n['depth']} {fname} <= {n['threshold']} n={n['n_samples']}")
 
     def to_dataframe(self, feature_names=None):
         """
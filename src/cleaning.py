@@ -1,12 +1,30 @@
 ## clean all data sources
 import pandas as pd
-from src.config import START_DATE, END_DATE
+from src.config import START_DATE, END_DATE, ECON_LAG
+
+# columns and (first, last) year window that each cleaner and the features built
+# on its output need from the raw source. The loaders only read these; None keeps
+# every column, and a None bound keeps every year on that side.
+IMF_COLUMNS = ['year','ccode_cow','cname_imf','country_syear','country_eyear','agree_count']
+IMF_YEARS = (START_DATE, END_DATE)
+# the transition count needs the full history and the polyarchy lead the year after END_DATE
+VDEM_COLUMNS = ['year','country_text_id','country_id','COWcode','country_name','codingstart','codingend','v2x_polyarchy','v2x_regime_amb']
+VDEM_YEARS = (None, END_DATE + 1)
+GWF_COLUMNS = ['year','cowcode','gwf_startdate','gwf_enddate','gwf_military','gwf_monarch']
+GWF_YEARS = (START_DATE, END_DATE)
+# lagged log differences need ECON_LAG + 1 years before START_DATE
+PWT_COLUMNS = ['year','countrycode','rgdpe','pop','emp','pl_m','pl_c','xr']
+PWT_YEARS = (START_DATE - ECON_LAG - 1, END_DATE)
+# the cleaner keeps every column but the indicator ones; the crash dummy needs two prior years
+IMF_XR_COLUMNS = None
+IMF_XR_YEARS = (START_DATE - 2, END_DATE)
+MEPV_COLUMNS = ['SCODE','CCODE','COUNTRY','YEAR','ACTOTAL']
+MEPV_YEARS = (START_DATE, END_DATE)
 
 # clean imf program data
 def clean_imf(df:pd.DataFrame) -> pd.DataFrame:
     # keep only relevant columns
-    cols = ['year','ccode_cow','cname_imf','country_syear','country_eyear','agree_count']
-    df = df[cols]
+    df = df[IMF_COLUMNS]
 
     # remove years after end_date and before start_date
     df = df[(df['year'] <= END_DATE) & (df['year'] >= START_DATE)]
@@ -30,8 +48,7 @@ def clean_imf(df:pd.DataFrame) -> pd.DataFrame:
 # clean vdem data
 def clean_vdem(df:pd.DataFrame) -> pd.DataFrame:
     # keep only relevant columns
-    cols = ['year','country_text_id','country_id','COWcode','country_name','codingstart','codingend','v2x_polyarchy','v2x_regime_amb']
-    df = df[cols]
+    df = df[VDEM_COLUMNS]
 
     # keep country-years between their start and end dates
     df = df[(df['year'] >= df['codingstart']) & (df['year'] <= df['codingend'])]
@@ -87,8 +104,7 @@ def clean_wb(df:pd.DataFrame) -> pd.DataFrame:
 # clean penn world table
 def clean_pwt(df:pd.DataFrame) -> pd.DataFrame:
     # keep only relevant columns
-    cols = ['year','countrycode','rgdpe','pop','emp','pl_m','pl_c','xr']
-    df = df[cols]
+    df = df[PWT_COLUMNS]
 
     # rename column for consistency
     df = df.rename(columns={'countrycode':'country_text_id'})
@@ -115,8 +131,7 @@ def clean_imf_xr(df:pd.DataFrame) -> pd.DataFrame:
 # Clean Major Episodes of Political Violence (mepv) data
 def clean_mepv(df:pd.DataFrame) -> pd.DataFrame:
     # keep only relevant columns
-    cols = ['SCODE','CCODE','COUNTRY','YEAR','ACTOTAL']
-    df = df[cols]
+    df = df[MEPV_COLUMNS]
 
     # rename columns
     df = df.rename(columns={'CCODE':'ccode_cow','YEAR':'year'})
@@ -22,6 +22,12 @@ FEATURES = [OUTCOME, TREATMENT] + CONTROLS
 # data path
 RAW_DATA = 'Data/raw/'
 INT_DATA = 'Data/intermediate'
+# Parquet copies of the raw source files (see src.cache.cached_loader)
+LOADER_CACHE = 'Data/intermediate/loader_cache'
+# outputs of the dataset stages (see src.pipeline.StageCache)
+STAGE_CACHE = 'Data/intermediate/stages'
+# per-indicator store of World Bank data (see src.wb_store.WorldBankStore)
+WB_STORE = 'Data/raw/world_bank'
 
 # World bank data indicators
 WB_INDICATORS = {
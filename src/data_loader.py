@@ -1,55 +1,63 @@
 ## data loader
 import pandas as pd
-import wbdata
-import time
-from pathlib import Path
-import datetime
-from src.config import START_DATE, END_DATE
+from src.config import START_DATE, END_DATE, WB_STORE
+from src.cache import cached_loader
+from src.wb_store import WorldBankStore
+
+
+# column types of the csv sources, so that the parser does not have to infer them
+VDEM_DTYPES = {'year': 'int64', 'country_text_id': 'str', 'country_id': 'int64', 'COWcode': 'float64',
+               'country_name': 'str', 'codingstart': 'int64', 'codingend': 'int64',
+               'v2x_polyarchy': 'float64', 'v2x_regime_amb': 'float64'}
+IMF_XR_DTYPES = {'COUNTRY': 'str', 'COUNTRY.ID': 'str', 'OBS_VALUE': 'float64'}
+
+# rows read at once from csv files when filtering years
+CHUNK_SIZE = 100_000
+
+
+# keep the rows whose year is inside years = (first, last); None keeps everything
+def filter_years(df:pd.DataFrame, year_col:str, years=None) -> pd.DataFrame:
+    if years is None:
+        return df
+    first, last = years
+    keep = pd.Series(True, index=df.index)
+    if first is not None:
+        keep &= df[year_col] >= first
+    if last is not None:
+        keep &= df[year_col] <= last
+    return df[keep]
+
+
+# read a csv in chunks, keeping only `columns` and the rows inside `years`
+def read_csv_filtered(path:str, year_col:str, columns=None, years=None, dtype=None) -> pd.DataFrame:
+    chunks = pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=CHUNK_SIZE)
+    return pd.concat([filter_years(chunk, year_col, years) for chunk in chunks], ignore_index=True)
 
 
 # import IMF program data
-def load_imf(path:str) -> pd.DataFrame:
-    return pd.read_stata(path)
+@cached_loader
+def load_imf(path:str, columns=None, years=None) -> pd.DataFrame:
+    df = pd.read_stata(path, columns=columns)
+    return filter_years(df, 'year', years).reset_index(drop=True)
 
 # import vdem data
-def load_vdem(path:str) -> pd.DataFrame:
-    return pd.read_csv(path)
+@cached_loader
+def load_vdem(path:str, columns=None, years=None) -> pd.DataFrame:
+    return read_csv_filtered(path, 'year', columns, years, dtype=VDEM_DTYPES)
 
 # import gwf autocracy data
-def load_gwf(path:str) -> pd.DataFrame:
-    return pd.read_excel(path, sheet_name='TSCS data')
-
-# import world bank data
-def load_wb(indicators: dict[str:str], cache_path=None) -> pd.DataFrame:
-    # check if data has been retrieved before
-    if cache_path and Path(cache_path).exists():
-        wdi_raw = pd.read_csv(cache_path).reset_index()
-    else:
-        max_retries = 5
-        start_date = datetime.datetime(START_DATE,1,1)
-        end_date = datetime.datetime(END_DATE,1,1)
-        # import data
-        for attempt in range(max_retries):
-            try:
-                wdi_raw = wbdata.get_dataframe(indicators=indicators,                                           
-                                               date=(start_date,end_date))
-                if wdi_raw.empty:
-                    raise ValueError("Empty WB response")
-                else:
-                    break
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    raise
-                print("Attempt #" + str(attempt))
-                time.sleep(2*(attempt+1))
-        # store to cache_path
-        if cache_path:
-            wdi_raw.to_csv(cache_path,index=False)
-
-    wdi_raw = wdi_raw.rename(columns={"country":"country_name"})
+@cached_loader
+def load_gwf(path:str, columns=None, years=None) -> pd.DataFrame:
+    df = pd.read_excel(path, sheet_name='TSCS data', usecols=columns)
+    return filter_years(df, 'year', years).reset_index(drop=True)
+
+# import world bank data from the local indicator store, fetching only what is missing
+def load_wb(indicators: dict[str:str], store_dir=WB_STORE, backend=None, max_workers=4) -> pd.DataFrame:
+    store = WorldBankStore(store_dir, backend=backend, max_workers=max_workers)
+    wdi_raw = store.get_dataframe(indicators, START_DATE, END_DATE)
 
     # import country code and region to match on country name
-    wdi_codes = pd.DataFrame(wbdata.get_countries())
+    wdi_codes = store.countries()
     wdi_codes = wdi_codes.rename(columns={"name":"country_name"})[["id","country_name","region"]]
     
     # merge data and country code together to assign country_code to each country
@@ -61,14 +69,19 @@ def load_wb(indicators: dict[str:str], cache_path=None) -> pd.DataFrame:
 
 
 # import penn world table variables
-def load_pwt(path:str) -> pd.DataFrame:
-    return pd.read_excel(path, sheet_name='Data')
+@cached_loader
+def load_pwt(path:str, columns=None, years=None) -> pd.DataFrame:
+    df = pd.read_excel(path, sheet_name='Data', usecols=columns)
+    return filter_years(df, 'year', years).reset_index(drop=True)
 
 # import IMF exchange rate data
-def load_imf_xr(path:str) -> pd.DataFrame:
-    return pd.read_csv(path)
+@cached_loader
+def load_imf_xr(path:str, columns=None, years=None) -> pd.DataFrame:
+    return read_csv_filtered(path, 'TIME_PERIOD', columns, years, dtype=IMF_XR_DTYPES)
 
 # import political violence index data
-def load_mepv(path:str) -> pd.DataFrame:
-    return pd.read_excel(path)
+@cached_loader
+def load_mepv(path:str, columns=None, years=None) -> pd.DataFrame:
+    df = pd.read_excel(path, usecols=columns)
+    return filter_years(df, 'YEAR', years).reset_index(drop=True)
 
@@ -1,50 +1,149 @@
 import logging
 logging.getLogger("shelved_cache").setLevel(logging.ERROR)
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 from src.data_loader import *
 from src.cleaning import *
 from src.features import *
-from src.config import RAW_DATA,INT_DATA,WB_INDICATORS,FEATURES
+from src.config import RAW_DATA,INT_DATA,WB_INDICATORS,FEATURES,STAGE_CACHE,ECON_LAG
 from src.merge import merge_all
+from src.pipeline import StageCache
+from src.incremental import append_panel
+from src.dtypes import compact_dtypes
 
-def create_dataset():
-    # Load data
-        imf_raw = load_imf(RAW_DATA + "imf_agreements/master_merge.dta")
-        vdem_raw = load_vdem(RAW_DATA + "vdem/V-Dem-CY-Full+Others-v15.csv")
-        gwf_raw = load_gwf(RAW_DATA + "GWF Autocratic Regimes 1.2/GWF Autocratic Regimes.xlsx")
-        wb_raw = load_wb(WB_INDICATORS, cache_path=RAW_DATA+"world_bank_data.csv")
-        pwt_raw = load_pwt(RAW_DATA + "pwt110.xlsx")
-        imfxr_raw = load_imf_xr(RAW_DATA + "imf data/imf_xr.csv")
-        mepv_raw = load_mepv(RAW_DATA + "mepv/MEPV2012ex.xls")
-        print("Data has been loaded")
-
-        # Clean data
-        imf = clean_imf(imf_raw)
-        vdem = clean_vdem(vdem_raw)
-        gwf = clean_gwf(gwf_raw)
-        wb = clean_wb(wb_raw)
-        pwt = clean_pwt(pwt_raw)
-        imfxr = clean_imf_xr(imfxr_raw)
-        mepv = clean_mepv(mepv_raw)
-        print("Data has been cleaned")
-
-        # Add features
-        imf = add_imf_prog(imf)
-        vdem = add_vdem_lags(vdem)
-        vdem = add_num_aut_trans(vdem)
-        wb = add_wb_vars(wb)
-        wb = add_wb_region(wb)
-        pwt = add_pwt_vars(pwt)
-        imfxr = add_curr_crash_dummy(imfxr)
-        print("Data-specific features have been added")
-
-        # Merge all datasets
-        main = merge_all(imf,vdem,gwf,wb,pwt,imfxr,mepv)
-        print('Data has been merged')
-
-        # Add additional cross-datasets features
-        main = add_oil_export_dummy(main)
-        main = add_year_dummies(main, bin_size=3)
-        print('Cross-data features have been added')
-
-        return main
\ No newline at end of file
+# load, clean and feature steps of every source, in the argument order of merge_all.
+# The chains are independent of each other until the merge.
+SOURCES = {
+    'imf': (partial(load_imf, RAW_DATA + "imf_agreements/master_merge.dta", columns=IMF_COLUMNS, years=IMF_YEARS),
+            clean_imf, [add_imf_prog]),
+    'vdem': (partial(load_vdem, RAW_DATA + "vdem/V-Dem-CY-Full+Others-v15.csv", columns=VDEM_COLUMNS, years=VDEM_YEARS),
+             clean_vdem, [add_vdem_lags, add_num_aut_trans]),
+    'gwf': (partial(load_gwf, RAW_DATA + "GWF Autocratic Regimes 1.2/GWF Autocratic Regimes.xlsx",
+                    columns=GWF_COLUMNS, years=GWF_YEARS),
+            clean_gwf, []),
+    'wb': (partial(load_wb, WB_INDICATORS),
+           clean_wb, [add_wb_vars, add_wb_region]),
+    'pwt': (partial(load_pwt, RAW_DATA + "pwt110.xlsx", columns=PWT_COLUMNS, years=PWT_YEARS),
+            clean_pwt, [add_pwt_vars]),
+    'imfxr': (partial(load_imf_xr, RAW_DATA + "imf data/imf_xr.csv", columns=IMF_XR_COLUMNS, years=IMF_XR_YEARS),
+              clean_imf_xr, [add_curr_crash_dummy]),
+    'mepv': (partial(load_mepv, RAW_DATA + "mepv/MEPV2012ex.xls", columns=MEPV_COLUMNS, years=MEPV_YEARS),
+             clean_mepv, []),
+}
+
+
+# how the featured panel of each source is extended with new years (see append_panel):
+# the unit column, the number of earlier and later rows of a unit the features read
+# and the prefixes of dummy columns
+APPEND_SPECS = {
+    'imf': dict(by='ccode_cow'),
+    'vdem': dict(by='country_id', lags=1, leads=1, cumulative={'num_aut_trans': 'ccode_cow'}),
+    'gwf': dict(by='ccode_cow'),
+    'wb': dict(by='country_text_id', lags=ECON_LAG + 1, dummies=('region_',)),
+    'pwt': dict(by='country_text_id', lags=ECON_LAG + 1),
+    'imfxr': dict(by='COUNTRY', lags=2),
+    'mepv': dict(by='ccode_cow'),
+}
+
+
+# apply data-specific feature functions in order, then store the columns compactly
+def add_features(df:pd.DataFrame, features=()) -> pd.DataFrame:
+    for add in features:
+        df = add(df)
+    return compact_dtypes(df)
+
+
+# features computed on the merged dataset
+def add_cross_features(main:pd.DataFrame) -> pd.DataFrame:
+    main = add_oil_export_dummy(main)
+    main = add_year_dummies(main, bin_size=3)
+    # the left joins turn integer columns with unmatched rows back into float64
+    return compact_dtypes(main)
+
+
+# run the load -> clean -> feature stages of one source, each from the cache when its
+# code, configuration and inputs are unchanged
+def build_source(name:str, cache_dir=STAGE_CACHE):
+    load, clean, features = SOURCES[name]
+    stages = StageCache(cache_dir)
+    # raw files bound to the loader
+    files = [a for a in load.args if isinstance(a, str)]
+
+    raw = stages.run(name + '/load', load, files=files)
+    cleaned = stages.run(name + '/clean', clean, [raw])
+    featured = stages.run(name + '/features', partial(add_features, features=tuple(features)), [cleaned])
+    return featured, stages.timings
+
+
+def print_stage_timings(timings:list) -> None:
+    for t in timings:
+        memory = '' if t['mb'] is None else f", {t['mb']:.1f}MB"
+        print(f"{t['stage']}: {t['status']} in {t['seconds']:.2f}s{memory}")
+
+
+def create_dataset(n_workers:int=len(SOURCES), backend:str='thread', cache_dir=STAGE_CACHE,
+                   return_sources:bool=False):
+    """
+    Build the merged country-year dataset from the stages load, clean and
+    features of every source, then merge and cross-features. Every stage
+    output is cached in cache_dir under a hash of its inputs, code and the
+    config values it reads (see src.pipeline.StageCache), so a change only
+    rebuilds the affected stages and those downstream of them; None disables
+    the cache.
+
+    The source chains run concurrently on n_workers workers (1 runs them one
+    after another). Threads suit cached and csv sources; backend='process' also
+    parallelizes uncached Excel parsing, but then the calling script needs an
+    `if __name__ == '__main__'` guard.
+
+    If return_sources, also return the featured panel of every source (name ->
+    DataFrame), which append_dataset can extend with new years.
+    """
+    # Load, clean and add data-specific features
+    start = time.perf_counter()
+    if n_workers == 1:
+        results = [build_source(name, cache_dir) for name in SOURCES]
+    else:
+        Executor = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}[backend]
+        with Executor(max_workers=n_workers) as pool:
+            results = list(pool.map(build_source, SOURCES, [cache_dir] * len(SOURCES)))
+    print_stage_timings([t for _, timings in results for t in timings])
+    print(f"Data has been loaded, cleaned and data-specific features added in {time.perf_counter() - start:.2f}s")
+
+    stages = StageCache(cache_dir)
+    # Merge all datasets
+    merged = stages.run('merge', merge_all, [featured for featured, _ in results])
+    # Add additional cross-datasets features
+    main, _ = stages.run('cross_features', add_cross_features, [merged])
+    print_stage_timings(stages.timings)
+    print('Data has been merged and cross-data features have been added')
+
+    if return_sources:
+        return main, {name: featured for name, ((featured, _), _) in zip(SOURCES, results)}
+    return main
+
+
+def append_dataset(sources:dict, new_raw:dict):
+    """
+    Add new years of data to the featured source panels returned by
+    create_dataset(return_sources=True) and rebuild the merged dataset.
+
+    new_raw: source name -> raw rows of the new years, as returned by its loader.
+    Only the new rows and a few rows of history per country are cleaned and
+    featurized; lags, differences and transition counts carry on from the
+    stored panel.
+
+    returns: the merged dataset and the updated source panels
+    """
+    sources = dict(sources)
+    for name, raw in new_raw.items():
+        start = time.perf_counter()
+        _, clean, features = SOURCES[name]
+        sources[name] = compact_dtypes(append_panel(sources[name], clean(raw), features, **APPEND_SPECS[name]))
+        print(f"{name}: appended {len(raw)} raw rows in {time.perf_counter() - start:.2f}s")
+
+    main = merge_all(*(sources[name] for name in SOURCES))
+    main = add_cross_features(main)
+    return main, sources
@@ -1,80 +1,479 @@
 ## Causal Models
+import os
+import time
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 from sklearn.model_selection import StratifiedKFold
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingRegressor, HistGradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.base import clone
+from sklearn.utils import get_tags
+from threadpoolctl import threadpool_limits
+import joblib
 import pandas as pd
+from src.cache import DiskCache, hash_content, describe_model
 
-def dr_learner(X, y, w, n_splits=3, clip=(0.05,0.95), mu_model=None, prop_model=None, final_model=None, eps=1e-6, random_state=0):
+# outcome (nuisance) random forests
+MU_PARAMS = dict(n_estimators=200, max_depth=None, min_samples_leaf=5)
+# propensity random forest
+PROP_PARAMS = dict(n_estimators=200)
+# histogram gradient boosting used by the 'fast' nuisance engine (outcome and propensity)
+FAST_PARAMS = dict(max_iter=500, learning_rate=0.05, min_samples_leaf=20,
+                   early_stopping=True, validation_fraction=0.1, n_iter_no_change=20)
+# final CATE random forest
+TAU_PARAMS = dict(n_estimators=300, max_depth=None, min_samples_leaf=5)
+
+
+# set the number of threads of an estimator if it has an n_jobs parameter
+def _set_threads(model, n_jobs):
+    if n_jobs is not None and 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    return model
+
+
+def make_nuisance_models(engine='forest', mu_model=None, prop_model=None, random_state=0):
+    """
+    Unfitted (outcome, propensity) models used in each fold.
+
+    engine='forest' uses random forests, engine='fast' histogram gradient
+    boosting with early stopping. A user-provided mu_model or prop_model
+    replaces the engine's model.
+    """
+    if engine == 'forest':
+        base_mu = RandomForestRegressor(n_jobs=-1, random_state=random_state, **MU_PARAMS)
+        base_prop = RandomForestClassifier(n_jobs=-1, random_state=random_state, **PROP_PARAMS)
+    elif engine == 'fast':
+        base_mu = HistGradientBoostingRegressor(random_state=random_state, **FAST_PARAMS)
+        base_prop = HistGradientBoostingClassifier(random_state=random_state, **FAST_PARAMS)
+    else:
+        raise ValueError("engine must be 'forest' or 'fast'")
+
+    if mu_model is not None:
+        base_mu = mu_model
+    if prop_model is not None:
+        base_prop = prop_model
+    return base_mu, base_prop
+
+
+# fit one outcome model per arm; a 2-D y is fitted either as a single
+# multi-output model or as one model per column in a thread pool (models
+# without multi-output support always use one model per column)
+def _fit_outcome(X, y, base_mu, n_threads=None, outcome_mode='multioutput'):
+    if outcome_mode not in ('multioutput', 'separate'):
+        raise ValueError("outcome_mode must be 'multioutput' or 'separate'")
+
+    if y.ndim == 1 or (outcome_mode == 'multioutput' and get_tags(base_mu).target_tags.multi_output):
+        mu = _set_threads(clone(base_mu), n_threads)
+        return mu.fit(X, y)
+
+    # split the thread budget between the columns
+    n_cols = y.shape[1]
+    col_threads = max(1, (n_threads or os.cpu_count() or 1) // n_cols)
+
+    def _fit_column(k):
+        mu = _set_threads(clone(base_mu), col_threads)
+        return mu.fit(X, y[:, k])
+
+    with ThreadPoolExecutor(max_workers=n_cols) as pool:
+        return list(pool.map(_fit_column, range(n_cols)))
+
+
+# predict with a model returned by _fit_outcome
+def _predict_outcome(mu, X):
+    if isinstance(mu, list):
+        return np.column_stack([m.predict(X) for m in mu])
+    return mu.predict(X)
+
+
+# fit the nuisance models on one fold and predict on its held-out part
+def _fit_fold(X, y, w, train_idx, test_idx, base_mu, base_prop, n_threads=None, outcome_mode='multioutput',
+              return_models=False):
+    timings = {}
+    start = time.perf_counter()
+
+    # cap BLAS/OpenMP threads as well as the estimators' own n_jobs
+    with threadpool_limits(limits=n_threads):
+        X_tr, X_te = X[train_idx], X[test_idx]
+        y_tr = y[train_idx]
+        w_tr = w[train_idx]
+
+        # outcome models for nuisance functions
+        t = time.perf_counter()
+        mu0 = _fit_outcome(X_tr[w_tr == 0], y_tr[w_tr == 0], base_mu, n_threads, outcome_mode)
+        timings['mu0'] = time.perf_counter() - t
+        t = time.perf_counter()
+        mu1 = _fit_outcome(X_tr[w_tr == 1], y_tr[w_tr == 1], base_mu, n_threads, outcome_mode)
+        timings['mu1'] = time.perf_counter() - t
+        mu0_pred = _predict_outcome(mu0, X_te)
+        mu1_pred = _predict_outcome(mu1, X_te)
+
+        # Propensity: clone base_prop to get a fresh estimator per fold when needed
+        try:
+            e_model = clone(base_prop)
+        except Exception:
+            e_model = base_prop
+        _set_threads(e_model, n_threads)
+        t = time.perf_counter()
+        e_model.fit(X_tr, w_tr)
+        timings['propensity'] = time.perf_counter() - t
+        e_pred = e_model.predict_proba(X_te)[:, 1]
+
+    timings['total'] = time.perf_counter() - start
+    models = (mu0, mu1, e_model) if return_models else None
+    return mu0_pred, mu1_pred, e_pred, timings, models
+
+
+def cross_fit_nuisance(X, y, w, n_splits=3, prop_model=None, random_state=0, fold_jobs=None,
+                       cache_dir=None, cache_max_bytes=2**30, outcome_mode='multioutput', folds=None,
+                       return_models=False, engine='forest', mu_model=None, n_jobs=-1):
+    """
+    Out-of-fold predictions of the outcome models (mu0, mu1) and of the
+    propensity score (unclipped), plus the fit timings of each fold.
+    The models come from make_nuisance_models(engine, mu_model, prop_model).
+
+    y can be a 2-D matrix of outcomes (mu0 and mu1 then have the same shape);
+    the propensity model is still fitted once per fold. outcome_mode selects
+    whether the outcome models are one multi-output forest per arm
+    ('multioutput') or one forest per outcome fitted in parallel ('separate').
+
+    folds: optional precomputed list of (train_idx, test_idx) pairs shared
+    between runs; by default they come from a StratifiedKFold on w.
+
+    fold_jobs: None runs the folds one after another with every estimator using
+    the n_jobs threads. Otherwise up to fold_jobs folds run in separate
+    processes and each gets n_jobs // workers threads, so folds x threads
+    never exceeds the budget.
+
+    n_jobs: thread budget of the nuisance fits (-1 for all cores, None for 1).
+    With -1 and fold_jobs=None the estimators keep their own n_jobs.
+
+    cache_dir: if given, the predictions are stored there under a hash of X, y,
+    w, the nuisance model configuration, random_state and the folds, and reused
+    by later calls with the same inputs (timings are then empty). The
+    directory is kept under cache_max_bytes by evicting the least recently
+    used entries.
+
+    return_models: also return the fitted (mu0, mu1, propensity) models of each
+    fold as a fifth element. The cache is not read in that case.
+    """
+    n = len(y)
+
+    if folds is None:
+        kf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+        folds = list(kf.split(X, w))
+    n_splits = len(folds)
+
+    base_mu, base_prop = make_nuisance_models(engine, mu_model, prop_model, random_state)
+
+    if cache_dir is not None:
+        cache = DiskCache(cache_dir, max_bytes=cache_max_bytes)
+        fold_hash = hash_content(*[test_idx for _, test_idx in folds])
+        extra = ('nuisance', describe_model(base_mu), describe_model(base_prop), fold_hash)
+        if y.ndim > 1:
+            extra = extra + (outcome_mode,)
+        key = hash_content(X, y, w, extra=extra)
+        cached = None if return_models else cache.load_arrays(key)
+        if cached is not None:
+            return cached['mu0'], cached['mu1'], cached['e'], []
+
+    mu0_all = np.zeros(y.shape)
+    mu1_all = np.zeros(y.shape)
+    e_all = np.zeros(n)
+
+    budget = (os.cpu_count() or 1) if n_jobs == -1 else (n_jobs or 1)
+    if fold_jobs is None:
+        n_threads = None if n_jobs == -1 else budget
+        results = [_fit_fold(X, y, w, train_idx, test_idx, base_mu, base_prop, n_threads,
+                             outcome_mode=outcome_mode, return_models=return_models)
+                   for train_idx, test_idx in folds]
+    else:
+        n_workers = max(1, min(fold_jobs, n_splits))
+        n_threads = max(1, budget // n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(_fit_fold, X, y, w, train_idx, test_idx, base_mu, base_prop,
+                                   n_threads, outcome_mode, return_models)
+                       for train_idx, test_idx in folds]
+            results = [f.result() for f in futures]
+
+    timings = []
+    models = []
+    for k, ((_, test_idx), (mu0_pred, mu1_pred, e_pred, fold_timings, fold_models)) in enumerate(zip(folds, results)):
+        mu0_all[test_idx] = mu0_pred
+        mu1_all[test_idx] = mu1_pred
+        e_all[test_idx] = e_pred
+        timings.append({'fold': k, **fold_timings})
+        models.append(fold_models)
+
+    if cache_dir is not None:
+        cache.save_arrays(key, mu0=mu0_all, mu1=mu1_all, e=e_all)
+
+    if return_models:
+        return mu0_all, mu1_all, e_all, timings, models
+    return mu0_all, mu1_all, e_all, timings
+
+
+# print the fit timings returned by cross_fit_nuisance
+def print_timings(timings:list) -> None:
+    for t in timings:
+        print(f"Fold {t['fold']}: mu0 {t['mu0']:.2f}s, mu1 {t['mu1']:.2f}s, "
+              f"propensity {t['propensity']:.2f}s, total {t['total']:.2f}s")
+
+
+def dr_pseudo_outcome(y, w, mu0, mu1, e, clip=(0.05,0.95), eps=1e-6, cap=10):
+    """
+    Doubly robust pseudo-outcome (orthogonal score) from cross-fitted
+    predictions. e is clipped to `clip`, the denominator clamped to
+    max(e*(1-e), eps) and the result clipped to [-cap, cap]. For a 2-D y
+    (one column per outcome), w and e are broadcast over the columns. The clip
+    bounds and cap can be column arrays (n_settings, 1), giving one row of
+    scores per setting.
+    """
+    if np.ndim(y) == 2:
+        w = w[:, None]
+        e = e[:, None]
+    e = np.clip(e, clip[0], clip[1])
+
+    mu_t = mu0 * (1 - w) + mu1 * w
+    denom = np.maximum(e * (1 - e), eps)
+    phi = (mu1 - mu0) + (w - e) * (y - mu_t) / denom
+
+    # Clip extreme values for numerical stability
+    return np.clip(phi, -cap, cap)
+
+
+class DRLearner:
+    """
+    DR learner as a reusable estimator (see dr_learner for the method).
+
+    fit() keeps the final CATE forest, so predict() scores unseen rows without
+    retraining. With keep_nuisance=True the per-fold outcome and propensity
+    models are kept too (predict_nuisance averages them over folds).
+    The scores of the training rows are kept in `phi` for inference.
+
+    n_jobs is the thread budget of the nuisance and final forests (-1 for all
+    cores, None for 1), e.g. to run several learners side by side.
+
+    save()/load() store the fitted models in a compressed joblib file; load()
+    reads the whole forest into memory.
+    """
+    def __init__(self, n_splits=3, clip=(0.05,0.95), mu_model=None, prop_model=None, eps=1e-6, random_state=0,
+                 engine='forest', fold_jobs=None, cache_dir=None, keep_nuisance=False, n_jobs=-1):
+        self.n_splits = n_splits
+        self.clip = clip
+        self.mu_model = mu_model
+        self.prop_model = prop_model
+        self.engine = engine
+        self.eps = eps
+        self.random_state = random_state
+        self.fold_jobs = fold_jobs
+        self.cache_dir = cache_dir
+        self.keep_nuisance = keep_nuisance
+        self.n_jobs = n_jobs
+        self.tau_model = None
+        self.nuisance_models = None
+        self.phi = None
+
+    def fit(self, X, y, w, folds=None, verbose=False):
+        X = np.asarray(X)
+        y = np.asarray(y)
+        w = np.asarray(w)
+        assert X.shape[0] == y.shape[0] == w.shape[0]
+
+        # cross-fitted nuisance predictions
+        nuisance = cross_fit_nuisance(
+            X, y, w, n_splits=self.n_splits, prop_model=self.prop_model, random_state=self.random_state,
+            fold_jobs=self.fold_jobs, cache_dir=self.cache_dir, folds=folds, return_models=self.keep_nuisance,
+            engine=self.engine, mu_model=self.mu_model, n_jobs=self.n_jobs
+        )
+        mu0_all, mu1_all, e_all, timings = nuisance[:4]
+        self.nuisance_models = nuisance[4] if self.keep_nuisance else None
+
+        if verbose:
+            print_timings(timings)
+
+        # Doubly robust pseudo-outcome (orthogonal score)
+        self.phi = dr_pseudo_outcome(y, w, mu0_all, mu1_all, e_all, clip=self.clip, eps=self.eps)
+
+        # Final CATE model (rich RF)
+        self.tau_model = RandomForestRegressor(n_jobs=self.n_jobs, random_state=self.random_state, **TAU_PARAMS)
+        self.tau_model.fit(X, self.phi)
+        return self
+
+    def predict(self, X):
+        return self.tau_model.predict(np.asarray(X))
+
+    def predict_nuisance(self, X):
+        """
+        Fold-averaged predictions (mu0, mu1, e) of the kept nuisance models,
+        with e clipped as in fit.
+        """
+        if self.nuisance_models is None:
+            raise ValueError("Nuisance models were not kept, fit with keep_nuisance=True")
+        X = np.asarray(X)
+        mu0 = np.mean([_predict_outcome(m[0], X) for m in self.nuisance_models], axis=0)
+        mu1 = np.mean([_predict_outcome(m[1], X) for m in self.nuisance_models], axis=0)
+        e = np.mean([m[2].predict_proba(X)[:, 1] for m in self.nuisance_models], axis=0)
+        return mu0, mu1, np.clip(e, self.clip[0], self.clip[1])
+
+    def save(self, path:str) -> None:
+        # only the settings and fitted models, not the training scores
+        state = {k: v for k, v in self.__dict__.items() if k != 'phi'}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(state, path, compress=3)
+
+    @classmethod
+    def load(cls, path:str):
+        model = cls.__new__(cls)
+        model.__dict__.update(joblib.load(path))
+        model.phi = None
+        return model
+
+
+def dr_learner(X, y, w, n_splits=3, clip=(0.05,0.95), mu_model=None, prop_model=None, final_model=None, eps=1e-6, random_state=0,
+               engine='forest', fold_jobs=None, cache_dir=None, folds=None, n_jobs=-1, verbose=False):
     """
     X: array (n_samples, n_features)
     y: array (n_samples,)
     w: binary treatment array (n_samples,)
 
     Robust DR learner with:
+      - default outcome models = RandomForestRegressor, or mu_model if given
       - default propensity model = RandomForestClassifier
+      - engine='fast' switches both defaults to histogram gradient boosting
+        with early stopping
       - denominator clamped to max(e*(1-e), eps) to avoid numeric blowups
+      - optional fold-level parallelism (fold_jobs, see cross_fit_nuisance)
+      - optional on-disk cache of the cross-fitted nuisance predictions (cache_dir)
+      - optional precomputed fold assignment (folds)
+      - thread budget of all forests (n_jobs, -1 for all cores)
 
     returns: tau_hat array (n_samples,) and diagnostics if requested
     """
+    model = DRLearner(n_splits=n_splits, clip=clip, mu_model=mu_model, prop_model=prop_model, eps=eps,
+                      random_state=random_state, engine=engine, fold_jobs=fold_jobs, cache_dir=cache_dir,
+                      n_jobs=n_jobs)
+    model.fit(X, y, w, folds=folds, verbose=verbose)
+    ol_tau_hat = model.predict(X)
+    return ol_tau_hat
+
+
+def dr_learner_multi(X, Y, w, n_splits=3, clip=(0.05,0.95), mu_model=None, prop_model=None, eps=1e-6, random_state=0,
+                     engine='forest', outcome_mode='multioutput', fold_jobs=None, cache_dir=None, n_jobs=-1,
+                     verbose=False):
+    """
+    DR learner for several outcomes at once.
+
+    X: array (n_samples, n_features)
+    Y: outcome matrix (n_samples, n_outcomes)
+    w: binary treatment array (n_samples,)
+
+    The propensity model is fitted once per fold and shared by all outcomes.
+    outcome_mode='multioutput' fits the outcome models and the final CATE model
+    as multi-output forests, 'separate' fits one forest per outcome in parallel
+    (column k then matches dr_learner on Y[:, k]). n_jobs is the thread budget
+    of the nuisance fits and of the final forests, which share it between the
+    outcomes (-1 for all cores, None for 1).
+
+    returns: tau_hat matrix (n_samples, n_outcomes)
+    """
+    X = np.asarray(X)
+    Y = np.asarray(Y)
+    w = np.asarray(w)
+    assert Y.ndim == 2
+    assert X.shape[0] == Y.shape[0] == w.shape[0]
+
+    # cross-fitted nuisance predictions
+    mu0_all, mu1_all, e_all, timings = cross_fit_nuisance(
+        X, Y, w, n_splits=n_splits, prop_model=prop_model, random_state=random_state, fold_jobs=fold_jobs,
+        cache_dir=cache_dir, outcome_mode=outcome_mode, engine=engine, mu_model=mu_model, n_jobs=n_jobs
+    )
+
+    if verbose:
+        print_timings(timings)
+
+    # Doubly robust pseudo-outcomes, one column per outcome
+    phi = dr_pseudo_outcome(Y, w, mu0_all, mu1_all, e_all, clip=clip, eps=eps)
+
+    # Final CATE model(s) (rich RF)
+    n_threads = (os.cpu_count() or 1) if n_jobs == -1 else (n_jobs or 1)
+    if outcome_mode == 'multioutput':
+        tau_model = RandomForestRegressor(n_jobs=n_threads, random_state=random_state, **TAU_PARAMS)
+        tau_model.fit(X, phi)
+        return tau_model.predict(X)
+
+    # split the thread budget between the outcomes
+    n_cols = phi.shape[1]
+    col_threads = max(1, n_threads // n_cols)
+
+    def _fit_final(k):
+        tau_model = RandomForestRegressor(n_jobs=col_threads, random_state=random_state, **TAU_PARAMS)
+        tau_model.fit(X, phi[:, k])
+        return tau_model.predict(X)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(n_cols, n_threads))) as pool:
+        return np.column_stack(list(pool.map(_fit_final, range(phi.shape[1]))))
+
+
+def dr_sensitivity(X, y, w, clips=((0.05,0.95),), caps=(10,), n_splits=3, mu_model=None, prop_model=None, eps=1e-6,
+                   random_state=0, engine='forest', fold_jobs=None, cache_dir=None, n_jobs=-1, verbose=False):
+    """
+    Overlap sensitivity of the DR learner over a grid of propensity clip bounds
+    (clips) and pseudo-outcome caps (caps, the bound of np.clip(phi, -cap, cap)).
+
+    The nuisance models are cross-fitted once. The pseudo-outcomes of all
+    settings are computed in one broadcasted pass as an (n_settings, n_samples)
+    matrix, and the final CATE forests of the settings are fitted in parallel
+    (n_jobs threads in total, -1 for all cores, None for 1; the nuisance fits
+    use the same budget).
+
+    returns: DataFrame with one row per (clip, cap) setting holding the DR ATE
+    (mean score) and its standard error, summaries of the fitted CATEs and the
+    share of clipped propensities and capped scores.
+    """
     X = np.asarray(X)
     y = np.asarray(y)
     w = np.asarray(w)
     assert X.shape[0] == y.shape[0] == w.shape[0]
-    
-    # get outcome, treatment and controls from data
-    n = len(y)
 
-    mu0_all = np.zeros(n)
-    mu1_all = np.zeros(n)
-    e_all = np.zeros(n)
+    # cross-fitted nuisance predictions, shared by all settings
+    mu0_all, mu1_all, e_all, timings = cross_fit_nuisance(
+        X, y, w, n_splits=n_splits, prop_model=prop_model, random_state=random_state, fold_jobs=fold_jobs,
+        cache_dir=cache_dir, engine=engine, mu_model=mu_model, n_jobs=n_jobs
+    )
+    if verbose:
+        print_timings(timings)
 
-    # default propensity model: RandomForestClassifier unless user provided one
-    if prop_model is None:
-        base_prop = RandomForestClassifier(n_estimators=200, n_jobs=-1, random_state=random_state)
-    else:
-        base_prop = prop_model
+    # one row per setting, bounds as columns so they broadcast against the samples
+    settings = pd.DataFrame([(lo, hi, cap) for lo, hi in clips for cap in caps],
+                            columns=['clip_low', 'clip_high', 'cap'])
+    low = settings['clip_low'].to_numpy()[:, None]
+    high = settings['clip_high'].to_numpy()[:, None]
+    cap = settings['cap'].to_numpy()[:, None]
 
-    kf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
-    for train_idx, test_idx in kf.split(X, w):
-        X_tr, X_te = X[train_idx], X[test_idx]
-        y_tr = y[train_idx]
-        w_tr = w[train_idx]   
-        # Strong RF models for nuisance functions
-        mu0 = RandomForestRegressor(
-            n_estimators=200, n_jobs=-1, max_depth=None, min_samples_leaf=5, random_state=random_state
-        )
-        mu1 = RandomForestRegressor(
-            n_estimators=200, n_jobs=-1, max_depth=None, min_samples_leaf=5, random_state=random_state
-        )
-        mu0.fit(X_tr[w_tr == 0], y_tr[w_tr == 0])
-        mu1.fit(X_tr[w_tr == 1], y_tr[w_tr == 1])
-        mu0_all[test_idx] = mu0.predict(X_te)
-        mu1_all[test_idx] = mu1.predict(X_te)
+    phi = dr_pseudo_outcome(y, w, mu0_all, mu1_all, e_all, clip=(low, high), eps=eps, cap=cap)
 
-        # Propensity: clone base_prop to get a fresh estimator per fold when needed
-        try:
-            e_model = clone(base_prop)
-        except Exception:
-            e_model = base_prop
-        e_model.fit(X_tr, w_tr)
-        probs = e_model.predict_proba(X_te)[:, 1]
-        e_all[test_idx] = np.clip(probs, clip[0], clip[1])
-
-    # Doubly robust pseudo-outcome (orthogonal score)
-    mu_t = mu0_all * (1 - w) + mu1_all * w
-    denom = np.maximum(e_all * (1 - e_all), eps)
-    phi = (mu1_all - mu0_all) + (w - e_all) * (y - mu_t) / denom
-    
-    # Clip extreme values for numerical stability
-    phi = np.clip(phi, -10, 10)
+    # final CATE forests, sharing the thread budget between settings
+    n_settings = len(settings)
+    n_threads = os.cpu_count() if n_jobs == -1 else (n_jobs or 1)
+    n_workers = max(1, min(n_threads, n_settings))
+    tree_jobs = max(1, n_threads // n_workers)
 
-    # Final CATE model (rich RF)
-    tau_model = RandomForestRegressor(
-        n_estimators=300, n_jobs=-1, max_depth=None, min_samples_leaf=5, random_state=random_state
-    )
-    tau_model.fit(X, phi)
-    ol_tau_hat = tau_model.predict(X)
-    return ol_tau_hat
+    def _fit_final(s):
+        tau_model = RandomForestRegressor(n_jobs=tree_jobs, random_state=random_state, **TAU_PARAMS)
+        tau_model.fit(X, phi[s])
+        return tau_model.predict(X)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        tau_hat = np.vstack(list(pool.map(_fit_final, range(n_settings))))
 
+    n = len(y)
+    settings['ate'] = phi.mean(axis=1)
+    settings['ate_se'] = phi.std(axis=1, ddof=1) / np.sqrt(n)
+    settings['cate_mean'] = tau_hat.mean(axis=1)
+    settings['cate_std'] = tau_hat.std(axis=1)
+    settings['cate_p10'], settings['cate_p50'], settings['cate_p90'] = np.percentile(tau_hat, [10, 50, 90], axis=1)
+    settings['share_e_clipped'] = ((e_all < low) | (e_all > high)).mean(axis=1)
+    settings['share_phi_capped'] = (np.abs(phi) >= cap).mean(axis=1)
+    return settings
@@ -0,0 +1,45 @@
+## compact column types for the country-year panels
+import numpy as np
+import pandas as pd
+
+
+def compact_dtypes(df:pd.DataFrame, float_tol:float=0.0) -> pd.DataFrame:
+    """
+    Store every column of a panel in the smallest type that keeps its values:
+
+    - string columns (country codes and names) become categoricals
+    - integer columns, and float columns holding only whole numbers without
+      missing values, become the smallest signed integer type that fits
+      them (int8 for dummies, int16 for years)
+    - other float columns become float32 if that changes no value by more
+      than float_tol relative to its size (0 keeps only exact conversions,
+      e.g. whole numbers with missing values)
+
+    Apply after cleaning, since the cleaners write new values into the
+    string columns.
+    """
+    dtypes = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            if pd.api.types.infer_dtype(s, skipna=True) == 'string':
+                dtypes[col] = 'category'
+        elif pd.api.types.is_bool_dtype(s):
+            continue
+        elif pd.api.types.is_integer_dtype(s):
+            dtypes[col] = pd.to_numeric(s, downcast='signed').dtype
+        elif pd.api.types.is_float_dtype(s):
+            values = s.to_numpy()
+            if np.isfinite(values).all() and (values == np.round(values)).all() and (np.abs(values) < 2**53).all():
+                dtypes[col] = pd.to_numeric(s.astype(np.int64), downcast='signed').dtype
+                continue
+            with np.errstate(invalid='ignore', over='ignore'):
+                error = np.abs(values.astype(np.float32).astype(np.float64) - values)
+            if (np.isnan(values) | (error <= float_tol * np.abs(values))).all():
+                dtypes[col] = np.float32
+    return df.astype(dtypes)
+
+
+# memory of a DataFrame in megabytes, counting the content of object columns
+def memory_mb(df:pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
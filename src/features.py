@@ -2,7 +2,8 @@
 import pandas as pd
 import numpy as np
 from src.config import ECON_LAG, WB_INDICATORS, START_DATE
-from src.utils import count_transitions, opec_dummy, weo_dummy
+from src.utils import count_transitions, OPEC, WEO_OIL
+from src.panel import PanelIndex
 
 ############################################################################
 ## feature functions
@@ -15,8 +16,9 @@ def add_imf_prog(df:pd.DataFrame) -> pd.DataFrame:
 
 # add 1 lag and next period value for vdem v2x_polyarchy
 def add_vdem_lags(df:pd.DataFrame) -> pd.DataFrame:
-    df['v2x_polyarchy_l1'] = df.groupby('country_id')['v2x_polyarchy'].shift(1)
-    df['v2x_polyarchy_n1'] = df.groupby('country_id')['v2x_polyarchy'].shift(-1)
+    panel = PanelIndex.from_frame(df, 'country_id')
+    df['v2x_polyarchy_l1'] = panel.shift(df['v2x_polyarchy'], 1)
+    df['v2x_polyarchy_n1'] = panel.shift(df['v2x_polyarchy'], -1)
     # add growth rate
     df['v2x_polyarchy_gr'] = np.log(df['v2x_polyarchy_n1']) - np.log(df['v2x_polyarchy'])
     return df
@@ -27,8 +29,8 @@ def add_num_aut_trans(df:pd.DataFrame) -> pd.DataFrame:
     # create dummy to differentiate autocracries from democracies
     df['is_autocracy'] = (df['v2x_regime_amb'] < 4).astype(int)
 
-    # groupby and count the number of transitions from 0 to 1 in the dummy
-    df = df.groupby("ccode_cow", group_keys=False).apply(count_transitions)
+    # count the number of transitions from 0 to 1 in the dummy within each country
+    df = count_transitions(df, state='is_autocracy', name='num_aut_trans', unit='ccode_cow')
 
     return df
 
@@ -42,13 +44,12 @@ def add_wb_vars(df:pd.DataFrame) -> pd.DataFrame:
     # total debt to gdp
     df['wbi_total_debt2gdp'] = df['wbi_total_debt']/df['wbi_gdp']
     # exchange rate depreciation
-    df['wbi_xr_dep'] = df.groupby('country_text_id')['wbi_xr'].pct_change(fill_method=None)
+    panel = PanelIndex.from_frame(df, 'country_text_id')
+    df['wbi_xr_dep'] = panel.pct_change(df['wbi_xr'])
 
     # add lags
     econ_var = list(WB_INDICATORS.values()) + ['wbi_total_reserves2gni','l_wbi_gdp_pc','wbi_total_debt2gdp','wbi_xr_dep']
-    for v in econ_var:
-        for i in range(1,ECON_LAG+1):
-            df[v+"_l"+str(i)] = df.groupby('country_text_id')[v].shift(i)
+    df = pd.concat([df, panel.lags(df, econ_var, ECON_LAG)], axis=1)
 
     return df
 
@@ -78,7 +79,8 @@ def add_wb_region(df:pd.DataFrame) -> pd.DataFrame:
     
     # drop 1 dummy for base case
     df = pd.concat([df, region_dummies], axis=1)
-    df.drop(columns=['region_Sub-Saharan Africa', 'region_Aggregates', 'wbi_region_name'], inplace=True)
+    # (when updating a few countries, the window may have neither region)
+    df.drop(columns=['region_Sub-Saharan Africa', 'region_Aggregates', 'wbi_region_name'], inplace=True, errors='ignore')
    
     
 
@@ -93,16 +95,13 @@ def add_pwt_vars(df:pd.DataFrame) -> pd.DataFrame:
     df['l_pl_m'] = np.log(df['pl_m'])
     df['emp_rate'] = df['emp']/df['pop']
 
-    df['ld_rgdpe_pc'] = df.groupby('country_text_id')['l_rgdpe_pc'].diff()
-    df['ld_pl_c'] = df.groupby('country_text_id')['l_pl_c'].diff()
-    df['ld_pl_m'] = df.groupby('country_text_id')['l_pl_m'].diff()
+    panel = PanelIndex.from_frame(df, 'country_text_id')
+    df[['ld_rgdpe_pc','ld_pl_c','ld_pl_m']] = panel.diff(df[['l_rgdpe_pc','l_pl_c','l_pl_m']])
 
     df.drop(columns=['l_pl_c','l_pl_m'], inplace=True)
 
     # add lags of the econ variables
-    for c in df.columns[2:]:
-        for i in range(1,ECON_LAG+1):
-            df[c+"_l"+str(i)] = df.groupby('country_text_id')[c].shift(i)
+    df = pd.concat([df, panel.lags(df, list(df.columns[2:]), ECON_LAG)], axis=1)
 
     return df
 
@@ -113,10 +112,10 @@ def add_oil_export_dummy(df:pd.DataFrame) -> pd.DataFrame:
     df["oil_from_wbi"] = (df["wbi_fuel_export_share"] >= 33).astype(int)
 
     # OPEC fallback
-    df["opec_oil"] = df.apply(opec_dummy, axis=1)
+    df["opec_oil"] = OPEC.lookup(df["country_text_id"], df["year"])
 
     # WEO fallback
-    df["weo_oil"] = df["country_text_id"].apply(weo_dummy)
+    df["weo_oil"] = WEO_OIL.lookup(df["country_text_id"], df["year"])
 
     # Final oil-exporter dummy
     df["oil_exporter"] = df[["oil_from_wbi","opec_oil","weo_oil"]].max(axis=1)
@@ -131,8 +130,9 @@ def add_oil_export_dummy(df:pd.DataFrame) -> pd.DataFrame:
 def add_curr_crash_dummy(df:pd.DataFrame) -> pd.DataFrame:
     # compute depreciation rate and change in depreciation rate
     df = df.sort_values(['COUNTRY','year'])
-    df['imf_xr_dep'] = df.groupby('COUNTRY')['imf_xr'].pct_change()
-    df['imf_xr_dep_acc'] = df.groupby('COUNTRY')['imf_xr_dep'].diff()
+    panel = PanelIndex.from_frame(df, 'COUNTRY')
+    df['imf_xr_dep'] = panel.pct_change(df['imf_xr'])
+    df['imf_xr_dep_acc'] = panel.diff(df['imf_xr_dep'])
     
     # create dummy 1 if country in crash
     df['imf_curr_crash'] = ((df['imf_xr_dep'] >= 0.3) & (df['imf_xr_dep_acc'] >= 0.1)).astype(int)
@@ -0,0 +1,194 @@
+## specification grid runner for robustness checks
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold
+from src.cache import hash_content
+from src.cleaning import clean_main
+from src.config import OUTCOME, TREATMENT, CONTROLS
+from src.doubleML import dr_learner
+from src.causalTree import CausalTree
+
+# specification used for every option not set in the grid
+DEFAULT_SPEC = {
+    'regions': True,
+    'years': True,
+    'remove_rich': True,
+    'controls': tuple(CONTROLS),
+    'clip': (0.05, 0.95),
+    'max_depth': 20,
+    'min_sample_leaf': 20,
+}
+
+# options that change the cleaned dataset (the rest only change the models)
+DATA_KEYS = ['regions', 'years', 'remove_rich', 'controls']
+
+
+# expand a dict of option -> list of values into one spec per combination
+def expand_grid(grid:dict) -> list[dict]:
+    keys = list(grid)
+    specs = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        spec = dict(DEFAULT_SPEC)
+        spec.update(zip(keys, values))
+        spec['controls'] = tuple(spec['controls'])
+        spec['clip'] = tuple(spec['clip'])
+        specs.append(spec)
+    return specs
+
+
+# id of a spec (or of the options `keys` of it) on the data described by `data_digest`
+def spec_id(spec:dict, keys=None, data_digest:str='') -> str:
+    keys = sorted(spec) if keys is None else keys
+    return hash_content(extra=([(k, spec[k]) for k in keys], data_digest))[:16]
+
+
+# content hash of the merged dataset and of the fold settings the jobs run on
+def data_digest(main:pd.DataFrame, n_splits:int, random_state:int) -> str:
+    rows = pd.util.hash_pandas_object(main, index=True).to_numpy()
+    return hash_content(rows, extra=(list(main.columns), [str(t) for t in main.dtypes], n_splits, random_state))
+
+
+# read the ids of the jobs already recorded as done in the ledger
+def read_ledger(path:Path) -> dict:
+    done = {}
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # line cut short by an interruption
+                    continue
+                if record.get('status') == 'done':
+                    done[record['job_id']] = record
+    return done
+
+
+# clean the dataset once for a data spec and store the model matrices and folds
+def prepare_data(main:pd.DataFrame, spec:dict, data_dir:Path, n_splits:int, random_state:int, digest:str) -> Path:
+    path = data_dir / spec_id(spec, DATA_KEYS, digest)
+    if (path / 'folds.npy').exists():
+        return path
+    path.mkdir(parents=True, exist_ok=True)
+
+    data, controls = clean_main(main, list(spec['controls']), TREATMENT, OUTCOME,
+                                regions=spec['regions'], years=spec['years'], remove_rich=spec['remove_rich'])
+    X = data[controls].to_numpy(dtype=float)
+    y = data[OUTCOME].to_numpy(dtype=float)
+    w = data[TREATMENT].to_numpy(dtype=int)
+
+    # fold id of every row, shared by all jobs on this dataset
+    fold_id = np.zeros(len(y), dtype=np.int8)
+    kf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for k, (_, test_idx) in enumerate(kf.split(X, w)):
+        fold_id[test_idx] = k
+
+    np.save(path / 'X.npy', X)
+    np.save(path / 'y.npy', y)
+    np.save(path / 'w.npy', w)
+    data[['year', 'ccode_cow', 'cname_imf']].to_csv(path / 'ids.csv', index=False)
+    # written last: its presence marks the dataset as complete
+    np.save(path / 'folds.npy', fold_id)
+    return path
+
+
+# run the models of one job (in a worker process) and store its results
+def run_job(job_id:str, spec:dict, data_path:Path, results_dir:Path, random_state:int, cache_dir,
+            n_threads:int) -> dict:
+    start = time.perf_counter()
+
+    # memory-map the shared matrices instead of copying them into every worker
+    X = np.load(data_path / 'X.npy', mmap_mode='r')
+    y = np.load(data_path / 'y.npy', mmap_mode='r')
+    w = np.load(data_path / 'w.npy', mmap_mode='r')
+    fold_id = np.load(data_path / 'folds.npy')
+    folds = [(np.flatnonzero(fold_id != k), np.flatnonzero(fold_id == k)) for k in np.unique(fold_id)]
+
+    dr_hte = dr_learner(X, y, w, clip=spec['clip'], random_state=random_state, cache_dir=cache_dir, folds=folds,
+                        n_jobs=n_threads)
+
+    ct = CausalTree(max_depth=spec['max_depth'], min_sample_leaf=spec['min_sample_leaf'], random_state=random_state,
+                    n_jobs=n_threads)
+    ct_hte = ct.fit(X, y, w).predict(X)
+
+    results = pd.read_csv(data_path / 'ids.csv')
+    results['dr_hte'] = dr_hte
+    results['ct_hte'] = ct_hte
+    tmp = results_dir / (job_id + '.tmp.csv')
+    results.to_csv(tmp, index=False)
+    tmp.replace(results_dir / (job_id + '.csv'))
+
+    return {
+        'job_id': job_id,
+        'status': 'done',
+        'spec': {k: list(v) if isinstance(v, tuple) else v for k, v in spec.items()},
+        'n': len(y),
+        'ate_dr': float(np.mean(dr_hte)),
+        'ate_ct': float(np.nanmean(ct_hte)),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run_grid(main:pd.DataFrame, grid:dict, results_dir:str, n_workers:int=1,
+             n_splits:int=3, random_state:int=0, cache_dir=None) -> pd.DataFrame:
+    """
+    Run every specification of `grid` (option -> list of values, see DEFAULT_SPEC)
+    on the merged dataset `main`.
+
+    Each distinct cleaned dataset is built once, stored under results_dir/data
+    with its fold assignment and shared by all jobs using it. Jobs run in a
+    process pool; each finished job writes results_dir/<job_id>.csv and appends
+    a line to results_dir/ledger.jsonl, so an interrupted sweep skips the jobs
+    already done when it is started again. Job and dataset ids include a hash
+    of `main`, n_splits and random_state, so a rebuilt dataset or other folds
+    run every job again. Passing cache_dir also shares the nuisance fits
+    between jobs that only differ in clip or tree options. Each worker gets
+    cpu_count // n_workers threads.
+
+    returns: one row per job with its spec and summary results
+    """
+    results_dir = Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    ledger_path = results_dir / 'ledger.jsonl'
+    done = read_ledger(ledger_path)
+
+    digest = data_digest(main, n_splits, random_state)
+    jobs = {spec_id(spec, data_digest=digest): spec for spec in expand_grid(grid)}
+    todo = {job_id: spec for job_id, spec in jobs.items() if job_id not in done}
+    print(f"{len(jobs)} jobs, {len(jobs) - len(todo)} already done")
+
+    # shared cleaned matrices, built in the parent process
+    data_paths = {job_id: prepare_data(main, spec, results_dir / 'data', n_splits, random_state, digest)
+                  for job_id, spec in todo.items()}
+    n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool, open(ledger_path, 'a') as ledger:
+        futures = {pool.submit(run_job, job_id, spec, data_paths[job_id], results_dir, random_state, cache_dir,
+                               n_threads): job_id
+                   for job_id, spec in todo.items()}
+        for future in as_completed(futures):
+            job_id = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                # failed jobs are recorded but rerun on the next start
+                record = {'job_id': job_id, 'status': 'failed', 'error': repr(e)}
+                print(f"Job {job_id} failed: {e!r}")
+            else:
+                done[job_id] = record
+                print(f"Job {job_id} done in {record['seconds']:.1f}s ({sum(j in done for j in jobs)}/{len(jobs)})")
+            # only the parent writes to the ledger, one complete line per job
+            ledger.write(json.dumps(record) + '\n')
+            ledger.flush()
+
+    summary = pd.json_normalize([done[job_id] for job_id in jobs if job_id in done])
+    return summary
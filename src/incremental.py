@@ -0,0 +1,86 @@
+## incremental update of featured source panels with new years of data
+import pandas as pd
+
+
+def append_panel(stored:pd.DataFrame, new_rows:pd.DataFrame, features:list, by,
+                 lags:int=1, leads:int=0, cumulative:dict=None, dummies:tuple=(),
+                 year:str='year') -> pd.DataFrame:
+    """
+    Extend a featured panel with cleaned rows for later years, without
+    recomputing its history.
+
+    stored: panel returned by the feature functions `features`
+    new_rows: cleaned rows to add; stored rows from their first year on are replaced
+    by: column(s) identifying a panel unit (e.g. the country id)
+    lags: number of earlier rows of a unit the features read (e.g. 2 for a lagged difference)
+    leads: number of later rows of a unit the features read (e.g. 1 for a next-year value)
+    cumulative: column -> unit column of running counts (e.g. num_aut_trans -> ccode_cow)
+    dummies: prefixes of dummy columns set to 0 when no updated row has their
+        category (e.g. 'region_')
+
+    Every unit with new rows is updated from its own first new year: its
+    stored rows from that year on are replaced, and the features are
+    recomputed on its new rows plus its last lags + leads stored rows before
+    that year. The last `leads` of these stored rows are replaced as well,
+    since their leads now exist. Units without new rows keep all their stored
+    rows, so a partial or staggered refresh loses no data. Cumulative columns
+    restart in the window, so they are shifted by the stored count at the
+    first row of each unit's window. Raw columns the features drop (e.g. the
+    World Bank region) are not in the stored panel; the stored rows take them
+    from the first new row of their unit, so they must be fixed per unit.
+
+    returns: the updated panel, sorted by unit and year (stored itself if
+    new_rows is empty, e.g. when the cleaner keeps none of the new years)
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    if new_rows.empty:
+        return stored
+    # first new year of every updated unit, aligned with the rows of a frame (NaN for other units)
+    starts = new_rows.groupby(by, sort=False)[year].min().rename('_first').reset_index()
+    def first_year(df):
+        return df[by].merge(starts, on=by, how='left')['_first'].to_numpy()
+
+    stored = stored.sort_values(by + [year], kind='stable')
+    updated = ~pd.isna(first_year(stored))
+    before = stored[year].to_numpy() < first_year(stored)
+    kept = stored[~updated]
+    history = stored[updated & before]
+    # position of each stored row from the end of its unit's history (0 = last year before the new rows)
+    from_end = history.groupby(by, sort=False).cumcount(ascending=False)
+    shared = [c for c in new_rows.columns if c in history.columns]
+    context = history.loc[from_end < lags + leads, shared]
+    unchanged = history[from_end >= leads]
+
+    # raw columns the features dropped from the stored panel, from the unit's new rows
+    dropped = [c for c in new_rows.columns if c not in history.columns]
+    if dropped:
+        unit_values = new_rows.drop_duplicates(by)[by + dropped]
+        context = context.merge(unit_values, on=by, how='left')[list(new_rows.columns)]
+
+    window = pd.concat([context, new_rows], ignore_index=True)
+    window = window.sort_values(by + [year], kind='stable').reset_index(drop=True)
+    for add in features:
+        window = add(window)
+    window = window.sort_values(by + [year], kind='stable').reset_index(drop=True)
+    is_new = window[year].to_numpy() >= first_year(window)
+
+    for col, unit in (cumulative or {}).items():
+        # count at the first window row of every unit: stored vs recomputed from the window start
+        starts_col = window[~is_new].drop_duplicates(unit)[[unit, year, col]]
+        starts_col = starts_col.merge(history[[unit, year, col]].drop_duplicates([unit, year]),
+                                      on=[unit, year], suffixes=('', '_stored'))
+        offset = (starts_col[col + '_stored'] - starts_col[col]).set_axis(starts_col[unit])
+        window[col] = (window[col] + window[unit].map(offset).fillna(0)).astype(window[col].dtype)
+
+    # drop the context rows that only served as history for the new rows
+    window_from_end = window.groupby(by, sort=False).cumcount(ascending=False)
+    n_new = pd.Series(is_new).groupby([window[c] for c in by], sort=False).transform('sum')
+    window = window[is_new | (window_from_end < n_new + leads)]
+
+    # dummies of categories no updated row has
+    for c in stored.columns:
+        if c not in window.columns and c.startswith(tuple(dummies)):
+            window[c] = 0
+
+    panel = pd.concat([kept, unchanged, window[stored.columns]], ignore_index=True)
+    return panel.sort_values(by + [year], kind='stable').reset_index(drop=True)
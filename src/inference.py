@@ -0,0 +1,95 @@
+## inference on DR learner scores
+import numpy as np
+import pandas as pd
+
+
+def dr_inference(phi, groups=None, clusters=None, n_boot=2000, alpha=0.05, weights='gaussian',
+                 chunk_size=None, random_state=0) -> pd.DataFrame:
+    """
+    ATE and group ATEs (GATEs) with multiplier-bootstrap standard errors and
+    confidence intervals, from the orthogonal scores phi of a DR learner
+    (e.g. DRLearner.phi).
+
+    phi: scores (n_samples,)
+    groups: optional group label of each row (e.g. a region or a polyarchy bin)
+    clusters: optional cluster of each row (e.g. ccode_cow); all rows of a
+        cluster share the same bootstrap weight
+    weights: multiplier distribution, 'gaussian' or 'rademacher'
+    chunk_size: number of replications drawn at once (by default the weight
+        matrix of a chunk is kept around 64MB)
+
+    Every replication perturbs the centered scores with random weights. The
+    scores are first summed within (cluster, group), so a chunk of
+    replications is one (chunk, n_clusters) x (n_clusters, n_groups) matrix
+    product.
+
+    returns: one row for the ATE ('all') and one per group with the estimate,
+    bootstrap standard error, pointwise confidence interval, bootstrap p-value
+    (H0: effect is 0) and a uniform band over all rows (sup-t).
+    """
+    phi = np.asarray(phi, dtype=float)
+    n = len(phi)
+
+    # group codes, with the ATE as an extra last group holding every row
+    if groups is None:
+        group_codes, group_names = np.zeros(n, dtype=np.intp), np.array([], dtype=object)
+        n_groups = 0
+    else:
+        group_codes, group_names = pd.factorize(np.asarray(groups), sort=True)
+        n_groups = len(group_names)
+        if (group_codes < 0).any():
+            raise ValueError("groups contains missing values")
+    if clusters is None:
+        cluster_codes, n_clusters = np.arange(n), n
+    else:
+        cluster_codes, cluster_names = pd.factorize(np.asarray(clusters))
+        n_clusters = len(cluster_names)
+        if (cluster_codes < 0).any():
+            raise ValueError("clusters contains missing values")
+
+    counts = np.append(np.bincount(group_codes, minlength=n_groups)[:n_groups], n)
+    estimate = np.append(np.bincount(group_codes, weights=phi, minlength=n_groups)[:n_groups], phi.sum()) / counts
+
+    # centered scores summed by (cluster, group) and by cluster for the ATE
+    width = n_groups + 1
+    S = np.zeros((n_clusters, width))
+    if n_groups:
+        S[:, :n_groups] = np.bincount(cluster_codes * width + group_codes,
+                                      weights=phi - estimate[group_codes],
+                                      minlength=n_clusters * width).reshape(n_clusters, width)[:, :n_groups]
+    S[:, -1] = np.bincount(cluster_codes, weights=phi - estimate[-1], minlength=n_clusters)
+    S /= counts
+
+    # bootstrap deviations (n_boot, width), drawn chunk by chunk
+    if chunk_size is None:
+        chunk_size = max(1, 2**23 // n_clusters)
+    rng = np.random.default_rng(random_state)
+    deviations = np.empty((n_boot, width))
+    for start in range(0, n_boot, chunk_size):
+        size = min(chunk_size, n_boot - start)
+        if weights == 'gaussian':
+            xi = rng.standard_normal((size, n_clusters))
+        elif weights == 'rademacher':
+            xi = rng.choice(np.array([-1.0, 1.0]), size=(size, n_clusters))
+        else:
+            raise ValueError("weights must be 'gaussian' or 'rademacher'")
+        deviations[start:start + size] = xi @ S
+
+    se = deviations.std(axis=0, ddof=1)
+    low_q, high_q = np.quantile(deviations, [alpha / 2, 1 - alpha / 2], axis=0)
+    # sup-t critical value for a band covering all rows at once
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sup_t = np.nanmax(np.abs(deviations) / se, axis=1)
+    crit = np.quantile(sup_t, 1 - alpha)
+
+    return pd.DataFrame({
+        'group': list(group_names) + ['all'],
+        'n': counts,
+        'estimate': estimate,
+        'se': se,
+        'ci_low': estimate - high_q,
+        'ci_high': estimate - low_q,
+        'p_value': (np.abs(deviations) >= np.abs(estimate)).mean(axis=0),
+        'uniform_low': estimate - crit * se,
+        'uniform_high': estimate + crit * se,
+    })
@@ -1,6 +1,73 @@
 ## function to merge all datasets into one
+import numpy as np
 import pandas as pd
 
+# how each control dataset is joined onto the main (imf x vdem) dataset:
+# join keys, columns filled with 0 where the dataset has no row, and columns dropped
+MERGE_PLAN = {
+    'gwf': dict(on=['year','ccode_cow'], fill=['gwf_military','gwf_monarch']),
+    'wb': dict(on=['year','country_text_id']),
+    'pwt': dict(on=['year','country_text_id']),
+    'imfxr': dict(on=['year','country_text_id'], drop=['COUNTRY']),
+    # fill empty values with 0 for binary coding (I checked manually the validity of this)
+    'mepv': dict(on=['year','ccode_cow'], fill=['ACTOTAL'], drop=['SCODE','COUNTRY']),
+}
+
+
+class KeyIndex:
+    """
+    Integer code of every row of a frame for a set of key columns, built once
+    and matched against several other frames. Missing key values match each
+    other, as in DataFrame.merge.
+    """
+    def __init__(self, df:pd.DataFrame, on:list):
+        self.on = on
+        self.uniques = []
+        codes = np.zeros(len(df), dtype=np.int64)
+        for col in on:
+            c, u = pd.factorize(df[col], use_na_sentinel=False)
+            codes = codes * len(u) + c
+            self.uniques.append(u)
+        self.codes = codes
+
+    # codes of the rows of another frame (-1 where a key value never occurs in the indexed frame)
+    def encode(self, other:pd.DataFrame) -> np.ndarray:
+        codes = np.zeros(len(other), dtype=np.int64)
+        missing = np.zeros(len(other), dtype=bool)
+        for col, u in zip(self.on, self.uniques):
+            c = pd.Index(u).get_indexer(other[col])
+            missing |= c < 0
+            codes = codes * len(u) + c
+        return np.where(missing, -1, codes)
+
+    def match(self, other:pd.DataFrame, name:str):
+        """
+        Row of `other` matching each indexed row (-1 if none), or None when
+        `other` has duplicate keys among the matched ones (the join would fan out).
+        """
+        other_codes = self.encode(other)
+        # keys the indexed frame does not have never match
+        other_codes[~np.isin(other_codes, self.codes)] = -1
+        index = pd.Index(other_codes[other_codes >= 0])
+        if not index.is_unique:
+            dup = index[index.duplicated()].unique()
+            n_fanout = np.isin(self.codes, dup).sum()
+            print(f"{name}: {len(dup)} duplicated {self.on} keys, {n_fanout} rows fan out")
+            return None
+        hit = index.get_indexer(self.codes)
+        positions = np.where(hit >= 0, np.flatnonzero(other_codes >= 0)[hit], -1)
+        print(f"{name}: {(positions >= 0).sum()} of {len(positions)} rows matched on {self.on}")
+        return positions
+
+
+# rename colliding column names as DataFrame.merge does (suffixes _x and _y)
+def _add_columns(columns:list, new:list) -> tuple[list, list]:
+    clash = set(columns) & set(new)
+    columns = [c + '_x' if c in clash else c for c in columns]
+    new = [c + '_y' if c in clash else c for c in new]
+    return columns, new
+
+
 ## Function to build dataset
 def merge_all(
         imf:pd.DataFrame,
@@ -11,43 +78,55 @@ def merge_all(
         imfxr:pd.DataFrame,
         mepv:pd.DataFrame
 ) -> pd.DataFrame:
-    
+    """
+    Inner join of imf and vdem on (year, ccode_cow), then left joins of the
+    control datasets as set in MERGE_PLAN. The join keys of the main dataset
+    are indexed once per key set, every dataset is matched against them and
+    all columns are put together in a single concat. The match rate of every
+    dataset is printed, and a dataset with duplicate keys (which would add
+    rows to the panel) is reported and joined with DataFrame.merge, as before.
+    """
     # merge IMF and vdem (treatment and outcome) to create main dataset
-    main = imf.merge(vdem, on=['year','ccode_cow'], how='inner')
+    on = ['year','ccode_cow']
+    positions = KeyIndex(imf, on).match(vdem, 'vdem')
+    if positions is None:
+        main = imf.merge(vdem, on=on, how='inner')
+    else:
+        rows = positions >= 0
+        vdem_cols = [c for c in vdem.columns if c not in on]
+        imf_cols, new_cols = _add_columns(list(imf.columns), vdem_cols)
+        main = pd.concat([imf[rows].set_axis(imf_cols, axis=1).reset_index(drop=True),
+                          vdem[vdem_cols].iloc[positions[rows]].set_axis(new_cols, axis=1).reset_index(drop=True)],
+                         axis=1)
 
     # merge controls onto the main dataset
-    main = merge_gwf(main, gwf)
-    main = merge_wb(main, wb)
-    main = merge_pwt(main, pwt)
-    main = merge_imfxr(main, imfxr)
-    main = merge_mepv(main, mepv)
-    
-    return main
-
-## Functions to merge small datasets to main
-def merge_gwf(main:pd.DataFrame, gwf:pd.DataFrame) -> pd.DataFrame:
-    main = main.merge(gwf, on=['year','ccode_cow'], how='left')
-    # fill empty rows with 0 for binary coding
-    main['gwf_military'] = main['gwf_military'].fillna(value=0)
-    main['gwf_monarch'] = main['gwf_monarch'].fillna(value=0)
-    return main
-
-def merge_wb(main:pd.DataFrame, wb:pd.DataFrame) -> pd.DataFrame:
-    main = main.merge(wb, on=['year', 'country_text_id'], how='left')
-    return main
-
-def merge_pwt(main:pd.DataFrame, pwt:pd.DataFrame) -> pd.DataFrame:
-    main = main.merge(pwt, on=['year','country_text_id'], how='left')
-    return main
-
-def merge_imfxr(main:pd.DataFrame, imfxr:pd.DataFrame) -> pd.DataFrame:
-    main = main.merge(imfxr, on=['year','country_text_id'], how='left')
-    main = main.drop(columns=['COUNTRY'])
-    return main
-
-def merge_mepv(main:pd.DataFrame, mepv:pd.DataFrame) -> pd.DataFrame:
-    main = main.merge(mepv, on=['year', 'ccode_cow'], how='left')
-    # fill empty values with 0 for binary coding (I checked manually the validity of this)
-    main['ACTOTAL'] = main['ACTOTAL'].fillna(value=0)
-    main = main.drop(columns=['SCODE','COUNTRY'])
-    return main
+    controls = {'gwf': gwf, 'wb': wb, 'pwt': pwt, 'imfxr': imfxr, 'mepv': mepv}
+    # column blocks aligned with the rows of main, and the names of all their columns
+    blocks, columns, indexes = [main], list(main.columns), {}
+    for name, plan in MERGE_PLAN.items():
+        df = controls[name]
+        on = plan['on']
+        if tuple(on) not in indexes:
+            indexes[tuple(on)] = KeyIndex(main, on)
+        positions = indexes[tuple(on)].match(df, name)
+
+        if positions is None:
+            # duplicate keys: keep the merge semantics (and the extra rows)
+            main = pd.concat(blocks, axis=1).set_axis(columns, axis=1)
+            main = main.merge(df, on=on, how='left')
+            for c in plan.get('fill', []):
+                main[c] = main[c].fillna(value=0)
+            main = main.drop(columns=plan.get('drop', []))
+            blocks, columns, indexes = [main], list(main.columns), {}
+            continue
+
+        cols = [c for c in df.columns if c not in on and c not in plan.get('drop', [])]
+        # rows without a match come out missing, with the dtypes DataFrame.merge gives them
+        block = df[cols].reset_index(drop=True).reindex(positions).reset_index(drop=True)
+        for c in plan.get('fill', []):
+            block[c] = block[c].fillna(value=0)
+        columns, new = _add_columns(columns, cols)
+        columns += new
+        blocks.append(block)
+
+    return pd.concat(blocks, axis=1).set_axis(columns, axis=1)
@@ -0,0 +1,68 @@
+## vectorized lags, leads, differences and growth rates on unit-year panels
+import numpy as np
+import pandas as pd
+
+
+class PanelIndex:
+    """
+    Position of every row of a (unit, year) panel on a dense units x years
+    grid, computed once and shared by all transforms of the panel. Lags and
+    leads are taken in calendar years, so a value is missing when the unit
+    has no row for the year asked for (e.g. across a gap in its years).
+    Rows with a missing unit or year get missing values.
+    """
+    def __init__(self, units, years):
+        unit_codes, self.units = pd.factorize(np.asarray(units))
+        years = np.asarray(years, dtype=float)
+        self.valid = (unit_codes >= 0) & ~np.isnan(years)
+        if not self.valid.any():
+            raise ValueError("panel has no rows with a unit and a year")
+
+        self.first_year = int(years[self.valid].min())
+        self.n_years = int(years[self.valid].max()) - self.first_year + 1
+        self.year_pos = np.where(self.valid, years - self.first_year, 0).astype(np.intp)
+        self.cell = np.where(self.valid, unit_codes * self.n_years + self.year_pos, -1)
+
+        counts = np.bincount(self.cell[self.valid], minlength=len(self.units) * self.n_years)
+        if counts.max() > 1:
+            dup = np.flatnonzero(counts > 1)[0]
+            raise ValueError(f"duplicate panel rows for unit {self.units[dup // self.n_years]} "
+                             f"and year {self.first_year + dup % self.n_years}")
+
+    @classmethod
+    def from_frame(cls, df:pd.DataFrame, unit:str, year:str='year'):
+        return cls(df[unit], df[year])
+
+    def shift(self, values, k:int=1) -> np.ndarray:
+        """
+        Value of each row's unit k years earlier (k > 0, lag) or -k years
+        later (k < 0, lead). values: (n_rows,) or (n_rows, n_columns).
+        """
+        values = np.asarray(values, dtype=float)
+        flat = values.reshape(len(values), -1)
+        grid = np.full((len(self.units) * self.n_years, flat.shape[1]), np.nan)
+        grid[self.cell[self.valid]] = flat[self.valid]
+
+        target = self.year_pos - k
+        ok = self.valid & (target >= 0) & (target < self.n_years)
+        out = np.full(flat.shape, np.nan)
+        out[ok] = grid[self.cell[ok] - k]
+        return out.reshape(values.shape)
+
+    def diff(self, values, k:int=1) -> np.ndarray:
+        return np.asarray(values, dtype=float) - self.shift(values, k)
+
+    def pct_change(self, values, k:int=1) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.asarray(values, dtype=float) / self.shift(values, k) - 1
+
+    def lags(self, df:pd.DataFrame, columns:list, n_lags:int, suffix:str='_l') -> pd.DataFrame:
+        """
+        Lags 1..n_lags of `columns` as a DataFrame aligned with df, named
+        <column><suffix><lag> in column-major order, in one pass per lag.
+        """
+        values = df[columns].to_numpy(dtype=float)
+        shifted = [self.shift(values, i) for i in range(1, n_lags + 1)]
+        data = {c + suffix + str(i): shifted[i - 1][:, j]
+                for j, c in enumerate(columns) for i in range(1, n_lags + 1)}
+        return pd.DataFrame(data, index=df.index)
@@ -0,0 +1,157 @@
+## content-hashed cache of pipeline stage outputs
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+import types
+from pathlib import Path
+import pandas as pd
+from src.cache import DiskCache, hash_content, hash_file, read_json, write_atomic
+from src.dtypes import memory_mb
+
+
+# source code of func and of the src functions it calls, with the values of the
+# constants it reads (config values, column lists, ...), as one string
+def code_fingerprint(func, seen=None) -> str:
+    seen = set() if seen is None else seen
+    if hasattr(func, 'func'):  # functools.partial
+        func = func.func
+    if id(func) in seen:
+        return ''
+    seen.add(id(func))
+
+    parts = []
+    wrapped = getattr(func, '__wrapped__', None)
+    if wrapped is not None:
+        parts.append(code_fingerprint(wrapped, seen))
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return repr(func)
+    parts.append(inspect.getsource(func))
+
+    # global names read by the function and by its nested functions and lambdas
+    names, stack = set(), [code]
+    while stack:
+        c = stack.pop()
+        names.update(c.co_names)
+        stack += [k for k in c.co_consts if isinstance(k, types.CodeType)]
+
+    for name in sorted(names):
+        if name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        in_src = str(getattr(value, '__module__', '')).startswith('src.')
+        if isinstance(value, types.FunctionType):
+            if in_src:
+                parts.append(code_fingerprint(value, seen))
+        elif isinstance(value, type):
+            if in_src and id(value) not in seen:
+                seen.add(id(value))
+                parts.append(inspect.getsource(value))
+        elif name.isupper():
+            parts.append(f"{name} = {value!r}")
+    return '\n'.join(parts)
+
+
+# stable description of stage arguments (functions by their code, not their address)
+def describe_params(value) -> str:
+    if callable(value):
+        return code_fingerprint(value)
+    if isinstance(value, (list, tuple)):
+        return '(' + ', '.join(describe_params(v) for v in value) + ')'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f"{k!r}: {describe_params(v)}" for k, v in value.items()) + '}'
+    return repr(value)
+
+
+class StageCache:
+    """
+    Cache of named pipeline stages under `directory`. A stage's key hashes its
+    code (see code_fingerprint), its parameters, the content of its source
+    files and the output digests of its input stages, so changing a function,
+    a config value or a raw file rebuilds that stage and the stages using its
+    output. A rebuilt stage whose output is unchanged keeps its digest, and
+    the stages downstream of it are then still read from the cache.
+
+    run() returns (output, digest) pairs that are passed as inputs to later stages.
+
+    Entries are written atomically, so several processes can share the
+    directory, and an unreadable entry is rebuilt. Entries are touched when
+    read, and the least recently used ones are deleted once the directory
+    grows beyond max_bytes (None keeps everything).
+    """
+    def __init__(self, directory, max_bytes=2**31):
+        # None runs every stage without caching
+        self.directory = None if directory is None else Path(directory)
+        self.store = None if directory is None else DiskCache(directory, max_bytes=max_bytes)
+        self.timings = []
+
+    # content hash of a file, rehashed only when its size or mtime changes
+    def file_digest(self, path) -> str:
+        stat = os.stat(path)
+        memo_path = self.directory / ('file_' + hash_content(extra=str(Path(path).resolve()))[:24] + '.json')
+        memo = read_json(memo_path)
+        if memo.get('size') == stat.st_size and memo.get('mtime_ns') == stat.st_mtime_ns:
+            return memo['sha256']
+        digest = hash_file(path)
+        write_atomic(memo_path, json.dumps({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}))
+        return digest
+
+    def key(self, name:str, func, inputs=(), files=()) -> str:
+        # arguments bound by functools.partial are part of the stage
+        params = (getattr(func, 'args', ()), getattr(func, 'keywords', {}))
+        return hash_content(extra=(name, code_fingerprint(func), describe_params(params),
+                                   [self.file_digest(f) for f in files],
+                                   [digest for _, digest in inputs]))[:24]
+
+    def run(self, name:str, func, inputs=(), files=()):
+        """
+        Output of func(*outputs of inputs) from the cache, or computed and
+        stored. `files` are the raw files func reads.
+        """
+        start = time.perf_counter()
+        if self.directory is None:
+            output = func(*(output for output, _ in inputs))
+            self.timings.append({'stage': name, 'status': 'built', 'seconds': time.perf_counter() - start,
+                                 'mb': memory_mb(output) if isinstance(output, pd.DataFrame) else None})
+            return output, None
+
+        key = self.key(name, func, inputs, files)
+        stem = name.replace('/', '-') + '_' + key
+        path = self.directory / (stem + '.pkl')
+        digest_path = self.directory / (stem + '.sha256')
+
+        cached = self._load(path, digest_path)
+        if cached is not None:
+            output, digest = cached
+            status = 'cached'
+        else:
+            output = func(*(output for output, _ in inputs))
+            data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+            digest = hashlib.sha256(data).hexdigest()
+            # the digest is written last: an entry without one is a miss
+            write_atomic(path, data)
+            write_atomic(digest_path, digest)
+            self.store.evict()
+            status = 'built'
+
+        self.timings.append({'stage': name, 'status': status, 'seconds': time.perf_counter() - start,
+                             'mb': memory_mb(output) if isinstance(output, pd.DataFrame) else None})
+        return output, digest
+
+    # (output, digest) of a stored entry, None if it is missing, incomplete or unreadable
+    def _load(self, path:Path, digest_path:Path):
+        try:
+            digest = digest_path.read_text()
+            if len(digest) != 64:
+                return None
+            with open(path, 'rb') as f:
+                output = pickle.load(f)
+            # touch the entry so that it is evicted last
+            os.utime(path)
+            os.utime(digest_path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return output, digest
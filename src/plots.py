@@ -73,68 +73,53 @@ def plot_causal_tree(ct, filename=None, feature_names=None, figsize=(10, 6)):
     """
     import matplotlib.pyplot as plt
 
-    if ct.root is None:
+    if ct.tree is None or ct.tree.node_count == 0:
         raise ValueError("Tree is empty")
 
+    tree = ct.tree
     pos = {}
     # counter for assigning x coordinates to leaves
     leaf_counter = {'x': 0}
 
     def _layout(node, depth=0):
-        if node is None:
-            return None, None
-        if node.is_leaf:
+        if tree.left[node] == -1:
             x = leaf_counter['x']
             pos[node] = (x, -depth)
             leaf_counter['x'] += 1
             return x, x
-        left_min, left_max = _layout(node.left, depth+1)
-        right_min, right_max = _layout(node.right, depth+1)
-        # handle degenerate cases
-        if left_min is None and right_min is None:
-            x = leaf_counter['x']
-            pos[node] = (x, -depth)
-            leaf_counter['x'] += 1
-            return x, x
-        if left_min is None:
-            x = right_min
-        elif right_min is None:
-            x = left_max
-        else:
-            x = 0.5 * (left_min + right_max)
+        left_min, _ = _layout(tree.left[node], depth+1)
+        _, right_max = _layout(tree.right[node], depth+1)
+        x = 0.5 * (left_min + right_max)
         pos[node] = (x, -depth)
-        min_x = left_min if left_min is not None else x
-        max_x = right_max if right_max is not None else x
-        return min_x, max_x
+        return left_min, right_max
 
-    _layout(ct.root)
+    _layout(0)
 
     fig, ax = plt.subplots(figsize=figsize)
 
     # draw edges and nodes
     for node, (x, y) in pos.items():
-        if not node.is_leaf:
-            for child in (node.left, node.right):
-                if child is None:
-                    continue
+        if tree.left[node] != -1:
+            for child in (tree.left[node], tree.right[node]):
                 cx, cy = pos[child]
                 ax.plot([x, cx], [y, cy], color='k', linewidth=1)
 
     for node, (x, y) in pos.items():
-        if node.is_leaf:
-            label = f"Leaf\nn={node.n_samples}\ntau={node.tau if node.tau is not None else 'nan'}"
+        if tree.left[node] == -1:
+            label = f"Leaf\nn={tree.n_samples[node]}\ntau={tree.tau[node]}"
             bbox = dict(boxstyle="round,pad=0.3", fc="#f8cecc", ec="k")
         else:
+            feature = tree.feature[node]
             # safe feature name lookup (guard against short/missing feature_names)
-            if feature_names is not None and node.feature is not None:
+            if feature_names is not None:
                 try:
-                    fname = feature_names[node.feature]
+                    fname = feature_names[feature]
                 except Exception:
-                    fname = f"X[{node.feature}]"
+                    fname = f"X[{feature}]"
             else:
-                fname = f"X[{node.feature}]"
-            thr = f"{node.threshold:.3f}" if node.threshold is not None else "nan"
-            label = f"{fname} <= {thr}\nn={node.n_samples}"
+                fname = f"X[{feature}]"
+            thr = f"{tree.threshold[node]:.3f}"
+            label = f"{fname} <= {thr}\nn={tree.n_samples[node]}"
             bbox = dict(boxstyle="round,pad=0.3", fc="#c6dbef", ec="k")
         ax.text(x, y, label, ha='center', va='center', bbox=bbox, fontsize=9)
 
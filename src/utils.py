@@ -1,37 +1,97 @@
 ## utility functions
+import numpy as np
 import pandas as pd
 from src.config import OPEC_MEMBERSHIP, WEO_OIL_EXPORTERS
 
-# count the number of transitions from democracy to autocracy
-def count_transitions(subdf:pd.DataFrame) -> pd.DataFrame:
-    subdf = subdf.sort_values("year").copy()
-    
-    # Lag autocracy state
-    subdf["is_autocracy_lag"] = subdf["is_autocracy"].shift(1).fillna(0)
-    
-    # Transition occurs if previous year was NOT autocracy, current year IS autocracy
-    subdf["autocracy_transition"] = (
-        (subdf["is_autocracy"] == 1) &
-        (subdf["is_autocracy_lag"] == 0)
-    ).astype(int)
-    
-    # Cumulative count since 1946
-    subdf["num_aut_trans"] = subdf["autocracy_transition"].cumsum()
-
-    # drop transition and lag
-    subdf.drop(columns=['is_autocracy_lag','autocracy_transition'], inplace=True)
-    
-    return subdf
-
-
-# create dummy for opec members
-def opec_dummy(row):
-    iso = row["country_text_id"]
-    yr = row["year"]
-    if iso in OPEC_MEMBERSHIP:
-        start, end = OPEC_MEMBERSHIP[iso]
-        return int(start <= yr <= end)
-    return 0
-
-def weo_dummy(iso):
-    return 1 if iso in WEO_OIL_EXPORTERS else 0
\ No newline at end of file
+# count transitions of a state within each unit of a panel, on the whole panel at once
+def count_transitions(df:pd.DataFrame,
+                      state:str = 'is_autocracy',
+                      name:str = 'num_aut_trans',
+                      unit:str = 'ccode_cow',
+                      year:str = 'year',
+                      transition = None,
+                      initial = 0,
+                      spell:str = None) -> pd.DataFrame:
+    """
+    Add column `name` with the cumulative number of transitions of `state` in
+    each unit up to each year. A transition happens where transition(previous,
+    current) is true; by default it is a move from 0 to 1 (e.g. into
+    autocracy), and lambda prev, cur: (prev == 1) & (cur == 0) counts the
+    reverse (e.g. democratizations). The state before a unit's first row (and
+    a missing previous state) is `initial`.
+
+    If `spell` is given, also add that column with the number of years since
+    the unit's last transition (0 in the transition year, NaN before the first).
+
+    Rows without a unit are dropped and the result is sorted by unit and year.
+    """
+    if transition is None:
+        transition = lambda prev, cur: (cur == 1) & (prev == 0)
+
+    df = df[df[unit].notna()].sort_values([unit, year], kind='stable').copy()
+    codes = pd.factorize(df[unit])[0]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    # previous state of each row within its unit
+    current = df[state].to_numpy()
+    previous = pd.Series(current).shift(1).to_numpy(copy=True)
+    previous[starts] = initial
+    previous = np.where(pd.isna(previous), initial, previous)
+
+    # cumulative count restarted at the first row of every unit
+    trans = np.asarray(transition(previous, current), dtype=np.int64)
+    total = np.cumsum(trans)
+    before = total[starts] - trans[starts]
+    df[name] = total - np.repeat(before, np.diff(np.r_[starts, len(df)]))
+
+    if spell is not None:
+        years = df[year].to_numpy(dtype=float)
+        last = pd.Series(np.where(trans == 1, years, np.nan)).groupby(codes).ffill().to_numpy()
+        df[spell] = years - last
+
+    return df
+
+
+class Membership:
+    """
+    Time-varying membership table (e.g. OPEC members) compiled once into a
+    dense keys x years grid, so that membership is looked up for whole
+    columns of (key, year) pairs at once.
+
+    members: dict key -> (start, end) or a list of such intervals (inclusive
+    years, None for an open bound), or a list of keys that are members in
+    every year.
+    """
+    def __init__(self, members):
+        if not isinstance(members, dict):
+            members = {key: (None, None) for key in members}
+        intervals = {key: [v] if isinstance(v, tuple) else list(v) for key, v in members.items()}
+        self.intervals = intervals
+        self.keys = pd.Index(list(intervals))
+
+        bounds = [b for iv in intervals.values() for interval in iv for b in interval if b is not None]
+        # one column beyond the finite bounds on each side stands for all earlier and later years
+        self.first = min(bounds, default=0) - 1
+        self.last = max(bounds, default=0) + 1
+        self.grid = np.zeros((len(self.keys) + 1, self.last - self.first + 1), dtype=bool)
+        for row, iv in enumerate(intervals.values()):
+            for start, end in iv:
+                lo = self.first if start is None else start
+                hi = self.last if end is None else end
+                self.grid[row, lo - self.first:hi - self.first + 1] = True
+        # unknown keys map to the last, all-False row
+
+    # built from the table itself, so that it is the same in every process
+    # (pipeline stage keys include the repr of the constants a stage reads)
+    def __repr__(self) -> str:
+        return f"Membership({self.intervals!r})"
+
+    def lookup(self, keys, years) -> np.ndarray:
+        rows = self.keys.get_indexer(np.asarray(keys))
+        rows[rows < 0] = len(self.keys)
+        cols = np.clip(np.asarray(years, dtype=np.int64), self.first, self.last) - self.first
+        return self.grid[rows, cols].astype(np.int64)
+
+
+OPEC = Membership(OPEC_MEMBERSHIP)
+WEO_OIL = Membership(WEO_OIL_EXPORTERS)
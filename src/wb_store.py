@@ -0,0 +1,179 @@
+## local store of World Bank indicators, filled incrementally from a backend
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pandas as pd
+try:
+    import fcntl
+except ImportError:  # Windows: no locking between processes
+    fcntl = None
+from src.cache import read_json, write_atomic
+
+
+class WbdataBackend:
+    """
+    Fetch indicators and country metadata from the World Bank API through wbdata.
+    """
+    # indicator values of every country for the years first..last (country_name, date, value)
+    def fetch(self, code:str, first:int, last:int) -> pd.DataFrame:
+        import wbdata
+        series = wbdata.get_series(code, date=(datetime.datetime(first,1,1), datetime.datetime(last,1,1)))
+        if series.empty:
+            raise ValueError(f"Empty WB response for {code}")
+        df = series.rename('value').reset_index()
+        return df.rename(columns={'country':'country_name'})[['country_name','date','value']]
+
+    # id, name and region (a dict with the region 'value') of every country and aggregate
+    def countries(self) -> list[dict]:
+        import wbdata
+        return [{'id': c['id'], 'name': c['name'], 'region': dict(c['region'])} for c in wbdata.get_countries()]
+
+
+class LocalBackend:
+    """
+    Stand-in backend reading files from a directory, for offline runs and
+    checks: <code>.csv with columns country_name, date and value, and
+    countries.json with the output of WbdataBackend.countries().
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def fetch(self, code:str, first:int, last:int) -> pd.DataFrame:
+        df = pd.read_csv(self.directory / (code + '.csv'))
+        return df[(df['date'] >= first) & (df['date'] <= last)]
+
+    def countries(self) -> list[dict]:
+        return json.loads((self.directory / 'countries.json').read_text())
+
+
+# split a sorted list of years into contiguous (first, last) ranges
+def year_ranges(years:list) -> list[tuple]:
+    ranges = []
+    for y in years:
+        if ranges and y == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], y)
+        else:
+            ranges.append((y, y))
+    return ranges
+
+
+class WorldBankStore:
+    """
+    Directory holding one Parquet file per indicator (country_name, date,
+    value) and a manifest of the years already fetched for each indicator,
+    so that years without data are not requested again. Only the missing
+    (indicator, year range) slices are fetched from the backend, a few at a
+    time, each retried with exponential backoff. The country metadata is
+    fetched once and kept in countries.json. Several processes can use the
+    same store: its files are replaced atomically and the updates are made
+    under a lock file.
+    """
+    def __init__(self, directory, backend=None, max_workers=4, max_retries=5, backoff=2.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.backend = WbdataBackend() if backend is None else backend
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.manifest_path = self.directory / 'manifest.json'
+        self.manifest = read_json(self.manifest_path)
+
+    def path(self, code:str) -> Path:
+        return self.directory / (code + '.parquet')
+
+    # (code, first, last) slices of the requested years not in the store yet
+    def missing(self, codes:list, first:int, last:int) -> list[tuple]:
+        slices = []
+        for code in codes:
+            have = set(self.manifest.get(code, []))
+            todo = [y for y in range(first, last + 1) if y not in have]
+            slices += [(code, a, b) for a, b in year_ranges(todo)]
+        return slices
+
+    def _fetch_with_retries(self, code:str, first:int, last:int) -> pd.DataFrame:
+        for attempt in range(self.max_retries):
+            try:
+                return self.backend.fetch(code, first, last)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                delay = self.backoff * 2**attempt * (1 + random.random())
+                print(f"{code} {first}-{last}: attempt #{attempt} failed ({e!r}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def update(self, codes:list, first:int, last:int) -> None:
+        slices = self.missing(codes, first, last)
+        if not slices:
+            return
+        print(f"Fetching {len(slices)} World Bank slices")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [(s, pool.submit(self._fetch_with_retries, *s)) for s in slices]
+            # the store is only written from this thread
+            for (code, a, b), future in futures:
+                new = future.result()
+                new = new.assign(date=new['date'].astype(int), value=new['value'].astype(float))
+                # other builds may update the store at the same time: read, merge
+                # and write the indicator and the manifest under the store lock
+                with self._lock():
+                    path = self.path(code)
+                    if path.exists():
+                        old = pd.read_parquet(path)
+                        new = pd.concat([old[(old['date'] < a) | (old['date'] > b)], new], ignore_index=True)
+                    fd, tmp = tempfile.mkstemp(prefix=code + '.', suffix='.tmp.parquet', dir=self.directory)
+                    os.close(fd)
+                    try:
+                        new.sort_values(['country_name','date']).to_parquet(tmp, index=False)
+                        os.replace(tmp, path)
+                    finally:
+                        Path(tmp).unlink(missing_ok=True)
+                    self._write_manifest(code, range(a, b + 1))
+
+    # exclusive lock of the store between processes (readers need none, files are replaced atomically)
+    @contextlib.contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / 'store.lock', 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # add fetched years to the manifest, merged with the years other processes
+    # have recorded since it was read
+    def _write_manifest(self, code:str, years) -> None:
+        manifest = read_json(self.manifest_path)
+        for c in set(manifest) | set(self.manifest):
+            manifest[c] = sorted(set(manifest.get(c, [])) | set(self.manifest.get(c, [])))
+        manifest[code] = sorted(set(manifest.get(code, [])) | set(years))
+        write_atomic(self.manifest_path, json.dumps(manifest))
+        self.manifest = manifest
+
+    def countries(self) -> pd.DataFrame:
+        path = self.directory / 'countries.json'
+        if not path.exists():
+            write_atomic(path, json.dumps(self.backend.countries()))
+        return pd.DataFrame(json.loads(path.read_text()))
+
+    def get_dataframe(self, indicators:dict, first:int, last:int) -> pd.DataFrame:
+        """
+        Wide table of `indicators` (code -> column name) for the years
+        first..last, with one row per (country_name, date), fetching the
+        missing slices first.
+        """
+        self.update(list(indicators), first, last)
+        long = []
+        for code, name in indicators.items():
+            df = pd.read_parquet(self.path(code))
+            df = df[(df['date'] >= first) & (df['date'] <= last)]
+            long.append(df.assign(indicator=name))
+        wide = pd.concat(long, ignore_index=True).pivot(index=['country_name','date'], columns='indicator', values='value')
+        return wide[list(indicators.values())].reset_index().rename_axis(columns=None)
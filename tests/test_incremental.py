@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from src.incremental import append_panel
+
+
+# lag and next-year value of x within each country
+def add_lag_lead(df):
+    df = df.sort_values(['country', 'year']).copy()
+    df['x_l1'] = df.groupby('country')['x'].shift(1)
+    df['x_f1'] = df.groupby('country')['x'].shift(-1)
+    return df
+
+
+def make_rows(spans, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [(c, y) for c, (a, b) in spans.items() for y in range(a, b + 1)]
+    df = pd.DataFrame(rows, columns=['country', 'year'])
+    df['x'] = rng.normal(size=len(df))
+    return df
+
+
+def check(stored_spans, new_spans):
+    raw = make_rows({c: (a, b) for c, (a, b) in stored_spans.items()})
+    new = make_rows(new_spans, seed=1)
+    stored = add_lag_lead(raw).reset_index(drop=True)
+
+    out = append_panel(stored, new, [add_lag_lead], by='country', lags=1, leads=1)
+
+    # full rebuild: stored rows before each country's first new year, then the new rows
+    first = new.groupby('country')['year'].min()
+    keep = raw['year'] < raw['country'].map(first).fillna(np.inf)
+    expected = add_lag_lead(pd.concat([raw[keep], new])).reset_index(drop=True)
+    pd.testing.assert_frame_equal(out, expected[out.columns])
+
+
+def test_partial_vintage_keeps_units_without_new_rows():
+    # BBB has no new rows: its 1998-1999 rows must stay
+    check({'AAA': (1990, 1999), 'BBB': (1990, 1999)}, {'AAA': (1998, 2001)})
+
+
+def test_staggered_vintage_uses_each_units_first_year():
+    # BBB reports from 2001 on: its stored 1998-2000 rows are kept
+    check({'AAA': (1990, 2000), 'BBB': (1990, 2000)}, {'AAA': (1998, 2002), 'BBB': (2001, 2002)})
+
+
+def test_empty_new_rows_keep_stored_panel():
+    stored = add_lag_lead(make_rows({'AAA': (1990, 1999)}))
+    out = append_panel(stored, stored.iloc[:0][['country', 'year', 'x']], [add_lag_lead], by='country')
+    assert out is stored